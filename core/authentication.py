@@ -1,3 +1,9 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
 import jwt
 from django.conf import settings
 
@@ -7,6 +13,87 @@ from drf_spectacular.extensions import OpenApiAuthenticationExtension
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 
+from core.metrics import get_counters
+
+DEFAULT_TOKEN_CACHE_SIZE = 10000
+DEFAULT_TOKEN_CACHE_MAX_TTL = 3600  # sec, для токенов без exp
+
+
+class Principal(Mapping):
+    """
+    Пользователь из JWT: read-only mapping поверх payload,
+    request.user["role"] и request.user.get("user_id") работают как раньше
+    """
+
+    __slots__ = ("payload", "user_id", "role")
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.user_id = payload.get("user_id")
+        self.role = payload.get("role")
+
+    def __getitem__(self, key):
+        return self.payload[key]
+
+    def __iter__(self):
+        return iter(self.payload)
+
+    def __len__(self):
+        return len(self.payload)
+
+    def __repr__(self):
+        return f"Principal(user_id={self.user_id!r}, role={self.role!r})"
+
+
+class _TokenCache:
+    """
+    LRU проверенных токенов по sha256 токена, запись живёт до exp
+    """
+
+    def __init__(self):
+        self.counters = get_counters("jwt_token_cache")
+        self._data: OrderedDict[bytes, tuple[Principal, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Principal | None:
+        with self._lock:
+            entry = self._data.get(digest)
+            if entry and time.time() < entry[1]:
+                self._data.move_to_end(digest)
+                self.counters.incr("hits")
+                return entry[0]
+
+            if entry:
+                del self._data[digest]
+            self.counters.incr("misses")
+            return None
+
+    def set(self, digest: bytes, principal: Principal):
+        max_ttl = getattr(
+            settings, "JWT_TOKEN_CACHE_MAX_TTL", DEFAULT_TOKEN_CACHE_MAX_TTL
+        )
+        expires_at = time.time() + max_ttl
+        if isinstance(exp := principal.get("exp"), (int, float)):
+            expires_at = min(expires_at, exp)
+
+        with self._lock:
+            self._data[digest] = (principal, expires_at)
+            self._data.move_to_end(digest)
+
+            maxsize = getattr(settings, "JWT_TOKEN_CACHE_SIZE", DEFAULT_TOKEN_CACHE_SIZE)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+token_cache = _TokenCache()
+
 
 class StatelessJWTAuthenticationScheme(OpenApiAuthenticationExtension):
     target_class = "core.authentication.StatelessJWTAuthentication"
@@ -29,6 +116,11 @@ class StatelessJWTAuthentication(BaseAuthentication):
 
         token = auth_header.split(" ")[1]
 
+        # Токен живёт днями, поэтому HMAC проверяется один раз до exp
+        digest = hashlib.sha256(token.encode()).digest()
+        if principal := token_cache.get(digest):
+            return principal, None
+
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
@@ -36,7 +128,9 @@ class StatelessJWTAuthentication(BaseAuthentication):
         except jwt.InvalidTokenError:
             raise AuthenticationFailed("Неверный токен")
 
-        return payload, None
+        principal = Principal(payload)
+        token_cache.set(digest, principal)
+        return principal, None
 
 
 class ServiceAuthenticationScheme(OpenApiAuthenticationExtension):
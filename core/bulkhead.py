@@ -0,0 +1,175 @@
+"""
+Bulkhead'ы для safe_request: ограничение одновременных запросов к одному
+downstream-сервису, чтобы медленный сервис не занимал все воркеры.
+
+settings.SAFE_REQUEST_BULKHEADS — {name: {"max_concurrent": ..., "max_waiting": ..., "max_wait": ...}}
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from core.deadline import remaining
+from core.metrics import get_counters
+
+DEFAULT_MAX_CONCURRENT = 10
+DEFAULT_MAX_WAITING = 10
+DEFAULT_MAX_WAIT = 1  # sec
+ASYNC_POLL_INTERVAL = 0.01  # sec
+
+_bulkheads: dict[str, "Bulkhead"] = {}
+_lock = threading.Lock()
+
+
+class BulkheadFullError(Exception):
+    def __init__(self, name: str):
+        self.name = name
+        self.message = f"Bulkhead {name} переполнен"
+        super().__init__(self.message)
+
+
+class Bulkhead:
+    """
+    Не больше max_concurrent вызовов одновременно, не больше max_waiting в очереди,
+    в очереди ждём не дольше max_wait (и не дольше дедлайна запроса).
+    Иначе сразу BulkheadFullError
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        max_waiting: int = DEFAULT_MAX_WAITING,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.counters = get_counters(f"bulkhead.{name}")
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    def _wait_time(self) -> float:
+        if (left := remaining()) is None:
+            return self.max_wait
+        return max(0, min(self.max_wait, left))
+
+    def _try_acquire(self) -> bool:
+        # Вызывать под self._cond
+        if self._active >= self.max_concurrent:
+            return False
+        self._active += 1
+        self.counters.incr("acquired")
+        return True
+
+    def _enqueue(self):
+        # Вызывать под self._cond
+        if self._waiting >= self.max_waiting:
+            self.counters.incr("rejected")
+            raise BulkheadFullError(self.name)
+        self._waiting += 1
+        self.counters.incr("queued")
+
+    def _reject(self):
+        self.counters.incr("timeouts")
+        raise BulkheadFullError(self.name)
+
+    def acquire(self):
+        with self._cond:
+            if self._try_acquire():
+                return
+
+            self._enqueue()
+            try:
+                acquired = self._cond.wait_for(
+                    lambda: self._active < self.max_concurrent, self._wait_time()
+                ) and self._try_acquire()
+            finally:
+                self._waiting -= 1
+
+            if not acquired:
+                self._reject()
+
+    async def aacquire(self):
+        with self._cond:
+            if self._try_acquire():
+                return
+            self._enqueue()
+
+        # threading.Condition блокирует event loop, поэтому async ждёт опросом
+        acquired = False
+        until = time.monotonic() + self._wait_time()
+        try:
+            while not acquired and time.monotonic() < until:
+                await asyncio.sleep(ASYNC_POLL_INTERVAL)
+                with self._cond:
+                    acquired = self._try_acquire()
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+        if not acquired:
+            self._reject()
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def acquired(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aacquired(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            active, waiting = self._active, self._waiting
+        return {
+            "active": active,
+            "waiting": waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "saturation": active / self.max_concurrent,
+            **self.counters.snapshot(),
+        }
+
+
+def get_bulkhead(name: str) -> Bulkhead:
+    """
+    Возвращает bulkhead по имени, создаёт его при первом обращении
+    """
+    if bulkhead := _bulkheads.get(name):
+        return bulkhead
+
+    with _lock:
+        if name not in _bulkheads:
+            config = getattr(settings, "SAFE_REQUEST_BULKHEADS", {}).get(name, {})
+            _bulkheads[name] = Bulkhead(
+                name,
+                max_concurrent=config.get("max_concurrent", DEFAULT_MAX_CONCURRENT),
+                max_waiting=config.get("max_waiting", DEFAULT_MAX_WAITING),
+                max_wait=config.get("max_wait", DEFAULT_MAX_WAIT),
+            )
+        return _bulkheads[name]
+
+
+def get_bulkheads_stats() -> dict[str, dict]:
+    with _lock:
+        bulkheads = list(_bulkheads.values())
+    return {b.name: b.stats() for b in bulkheads}
@@ -0,0 +1,154 @@
+"""
+Реестр circuit breaker'ов: у каждой функции (или downstream-сервиса) свой breaker.
+Состояние по умолчанию хранится в памяти процесса, а через
+settings.SAFE_REQUEST_BREAKER_STORAGE его можно сделать общим для воркеров:
+
+- "file" — JSON-файлы в SAFE_REQUEST_BREAKER_STORAGE_DIR (все воркеры одной ноды)
+- "redis" — pybreaker.CircuitRedisStorage по SAFE_REQUEST_BREAKER_REDIS_URL
+- callable(name) -> pybreaker.CircuitBreakerStorage — своё хранилище
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import pybreaker
+from django.conf import settings
+
+DEFAULT_FAIL_MAX = 5 * 3
+DEFAULT_RESET_TIMEOUT = 90  # sec
+
+_breakers: dict[str, pybreaker.CircuitBreaker] = {}
+_lock = threading.Lock()
+_redis = None
+
+
+class FileCircuitBreakerStorage(pybreaker.CircuitBreakerStorage):
+    """
+    Состояние breaker'а в JSON-файле под flock, общее для процессов одной ноды
+    """
+
+    def __init__(self, name: str, directory: str):
+        super().__init__(name)
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"{name}.json")
+
+    def _read(self) -> dict:
+        try:
+            with open(self._path) as file:
+                fcntl.flock(file, fcntl.LOCK_SH)
+                return json.loads(file.read() or "{}")
+        except FileNotFoundError:
+            return {}
+
+    def _update(self, **changes):
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            data = json.loads(file.read() or "{}")
+
+            for key, change in changes.items():
+                data[key] = change(data.get(key, 0)) if callable(change) else change
+
+            file.seek(0)
+            file.truncate()
+            file.write(json.dumps(data))
+
+    @property
+    def state(self) -> str:
+        return self._read().get("state", pybreaker.STATE_CLOSED)
+
+    @state.setter
+    def state(self, state: str):
+        self._update(state=state)
+
+    def increment_counter(self):
+        self._update(counter=lambda value: value + 1)
+
+    def reset_counter(self):
+        self._update(counter=0)
+
+    def increment_success_counter(self):
+        self._update(success_counter=lambda value: value + 1)
+
+    def reset_success_counter(self):
+        self._update(success_counter=0)
+
+    @property
+    def counter(self) -> int:
+        return self._read().get("counter", 0)
+
+    @property
+    def success_counter(self) -> int:
+        return self._read().get("success_counter", 0)
+
+    @property
+    def opened_at(self):
+        if timestamp := self._read().get("opened_at"):
+            return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        return None
+
+    @opened_at.setter
+    def opened_at(self, value: datetime):
+        self._update(opened_at=value.timestamp())
+
+
+def _get_redis():
+    global _redis
+
+    if _redis is None:
+        import redis
+
+        _redis = redis.Redis.from_url(settings.SAFE_REQUEST_BREAKER_REDIS_URL)
+    return _redis
+
+
+def _create_storage(name: str):
+    backend = getattr(settings, "SAFE_REQUEST_BREAKER_STORAGE", None)
+
+    if backend == "file":
+        directory = getattr(
+            settings,
+            "SAFE_REQUEST_BREAKER_STORAGE_DIR",
+            os.path.join(tempfile.gettempdir(), "circuit-breakers"),
+        )
+        return FileCircuitBreakerStorage(name, directory)
+
+    if backend == "redis":
+        return pybreaker.CircuitRedisStorage(
+            pybreaker.STATE_CLOSED, _get_redis(), namespace=f"circuit-breaker:{name}"
+        )
+
+    if callable(backend):
+        return backend(name)
+
+    return None
+
+
+def get_circuit_breaker(name: str, exclude=None) -> pybreaker.CircuitBreaker:
+    """
+    Возвращает breaker по имени, создаёт его при первом обращении.
+    settings.SAFE_REQUEST_BREAKERS — {name: {"fail_max": ..., "reset_timeout": ...}}
+    """
+    if breaker := _breakers.get(name):
+        return breaker
+
+    with _lock:
+        if name not in _breakers:
+            config = getattr(settings, "SAFE_REQUEST_BREAKERS", {}).get(name, {})
+            _breakers[name] = pybreaker.CircuitBreaker(
+                fail_max=config.get("fail_max", DEFAULT_FAIL_MAX),
+                reset_timeout=config.get("reset_timeout", DEFAULT_RESET_TIMEOUT),
+                exclude=exclude,
+                state_storage=_create_storage(name),
+                name=name,
+            )
+        return _breakers[name]
+
+
+def get_circuit_breakers() -> dict[str, pybreaker.CircuitBreaker]:
+    with _lock:
+        return dict(_breakers)
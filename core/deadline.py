@@ -0,0 +1,142 @@
+"""
+Дедлайн входящего запроса. DeadlineMiddleware выставляет бюджет времени,
+safe_request по нему урезает таймауты и повторы, а пул сессий
+(core.http_sessions) передаёт остаток дальше в заголовке X-Request-Timeout.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Остаток бюджета в секундах, не зависит от расхождения часов между сервисами
+TIMEOUT_HEADER = "X-Request-Timeout"
+# Абсолютный дедлайн, unix timestamp в секундах
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# Меньше этого времени на попытку смысла делать запрос нет
+DEFAULT_MIN_ATTEMPT_TIME = 0.1  # sec
+
+# time.monotonic() момента дедлайна
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, message="Время на выполнение запроса истекло"):
+        self.message = message
+        super().__init__(self.message)
+
+
+def remaining() -> float | None:
+    """
+    Сколько секунд осталось до дедлайна, None если дедлайна нет
+    """
+    if (deadline := _deadline.get()) is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def set_deadline(seconds: float | None):
+    """
+    Выставляет дедлайн через seconds секунд, но не позже уже выставленного
+
+    :return: token для reset_deadline
+    """
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    if (current := _deadline.get()) is not None:
+        deadline = min(deadline, current) if deadline is not None else current
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: float | None):
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def check_deadline():
+    if (left := remaining()) is not None and left <= get_min_attempt_time():
+        raise DeadlineExceeded()
+
+
+def get_min_attempt_time() -> float:
+    return getattr(settings, "REQUEST_DEADLINE_MIN_ATTEMPT", DEFAULT_MIN_ATTEMPT_TIME)
+
+
+def get_timeout(timeout):
+    """
+    Урезает таймаут (число или (connect, read)) до остатка бюджета
+    """
+    if (left := remaining()) is None:
+        return timeout
+
+    left = max(left, 0)
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) if t is not None else left for t in timeout)
+    return min(timeout, left)
+
+
+def deadline_headers() -> dict[str, str]:
+    if (left := remaining()) is None:
+        return {}
+    return {TIMEOUT_HEADER: f"{max(left, 0):.3f}"}
+
+
+def stop_before_deadline(retry_state) -> bool:
+    """
+    tenacity stop: не начинать повтор, который не успеет завершиться до дедлайна
+    """
+    if (left := remaining()) is None:
+        return False
+    return left - (retry_state.upcoming_sleep or 0) <= get_min_attempt_time()
+
+
+def _parse_budget(request) -> float | None:
+    try:
+        if value := request.headers.get(TIMEOUT_HEADER):
+            return float(value)
+        if value := request.headers.get(DEADLINE_HEADER):
+            return float(value) - time.time()
+    except ValueError:
+        pass
+
+    return getattr(settings, "REQUEST_DEADLINE_DEFAULT", None)
+
+
+class DeadlineMiddleware:
+    """
+    Бюджет берётся из X-Request-Timeout, X-Request-Deadline
+    или settings.REQUEST_DEADLINE_DEFAULT (сек).
+    Поддерживает WSGI и ASGI: дедлайн выставляется и сбрасывается
+    в одном контексте вокруг get_response
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with deadline(_parse_budget(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with deadline(_parse_budget(request)):
+            return await self.get_response(request)
@@ -1,5 +1,8 @@
 import logging
+import random
+from collections.abc import Mapping
 
+from django.conf import settings
 from django.db.models import ProtectedError
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework.exceptions import (
@@ -11,7 +14,15 @@ from rest_framework.response import Response
 from rest_framework.views import exception_handler
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
+from core.bulkhead import BulkheadFullError
+from core.deadline import DeadlineExceeded
+from core.metrics import get_counters
+
+DEFAULT_CLIENT_ERROR_SAMPLE_RATE = 0.1
+
 logger = logging.getLogger(__name__)
+# Счётчики по "<status>.<code>" для дашбордов
+exc_counters = get_counters("exceptions")
 EXCEPTIONS = {
     NotAuthenticated: {
         "response": {
@@ -48,6 +59,20 @@ EXCEPTIONS = {
         },
         "status": 403,
     },
+    DeadlineExceeded: {
+        "response": {
+            "detail": "Время ожидания запроса истекло",
+            "code": "deadline_exceeded",
+        },
+        "status": 504,
+    },
+    BulkheadFullError: {
+        "response": {
+            "detail": "Сервис перегружен, повторите запрос позже",
+            "code": "service_overloaded",
+        },
+        "status": 503,
+    },
     500: {
         "response": {
             "detail": "Внутренняя ошибка",
@@ -58,16 +83,46 @@ EXCEPTIONS = {
 }
 
 
-def drf_exc_handler(exc, context):
-    user_id = (
-        context["request"].user.get("user_id")
-        if isinstance(context["request"].user, dict)
-        else None
-    )
-    logger.exception(
-        f"[DRF Exc Handler] Ошибка: {exc} | User: {user_id}", exc_info=True
+# Ожидаемые отказы при перегрузке: логируются как 4xx, без traceback
+LOAD_SHEDDING_EXCEPTIONS = (BulkheadFullError, DeadlineExceeded)
+
+
+def _get_user_id(request):
+    user = getattr(request, "user", None)
+    return user.get("user_id") if isinstance(user, Mapping) else None
+
+
+def _log_exception(handler, exc, request, response):
+    """
+    5xx — полный traceback, ожидаемые 4xx и отказы при перегрузке (503/504) —
+    одна строка без traceback с семплированием
+    (settings.DRF_CLIENT_ERROR_LOG_SAMPLE_RATE)
+    """
+    data = response.data if isinstance(response.data, dict) else {}
+    code = data.get("code", response.status_code)
+    exc_counters.incr(f"{response.status_code}.{code}")
+
+    if response.status_code >= 500 and not isinstance(exc, LOAD_SHEDDING_EXCEPTIONS):
+        logger.exception(
+            "[%s] Ошибка: %s | User: %s", handler, exc, _get_user_id(request)
+        )
+        return
+
+    sample_rate = getattr(
+        settings, "DRF_CLIENT_ERROR_LOG_SAMPLE_RATE", DEFAULT_CLIENT_ERROR_SAMPLE_RATE
     )
+    if random.random() < sample_rate:
+        logger.info(
+            "[%s] %s %s: %s | User: %s",
+            handler,
+            response.status_code,
+            code,
+            exc,
+            _get_user_id(request),
+        )
+
 
+def _handle(exc, context):
     if response := exception_handler(exc, context):
         exception = EXCEPTIONS.get(type(exc), None)
 
@@ -91,15 +146,17 @@ def drf_exc_handler(exc, context):
         return Response(exception["response"], status=exception["status"])
 
 
+def drf_exc_handler(exc, context):
+    response = _handle(exc, context)
+    _log_exception("DRF Exc Handler", exc, context["request"], response)
+    return response
+
+
 class DjExcHandlerMiddleware(MiddlewareMixin):
     def process_exception(self, request, exc):
-        user_id = (
-            request.user.get("user_id") if isinstance(request.user, dict) else None
-        )
-        logger.exception(
-            f"[DJ Exc Handler] Ошибка: {exc} | User: {user_id}", exc_info=True
-        )
-        return Response(EXCEPTIONS[500]["response"], status=500)
+        response = Response(EXCEPTIONS[500]["response"], status=500)
+        _log_exception("DJ Exc Handler", exc, request, response)
+        return response
 
 
 class ConflictException(APIException):
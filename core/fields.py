@@ -1,10 +1,50 @@
+import re
+
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.validators import EmailValidator
 from rest_framework import serializers
-from rest_framework.fields import RegexValidator
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import RegexValidator, get_error_detail
 
 from core.consts import COUNTRY_CODES, PHONE_REGEX
 
+PHONE_PATTERN = re.compile(PHONE_REGEX)
+# Для нормализации: код страны + 10 цифр без разделителей
+PHONE_SEPARATORS = re.compile(r"[\s\-()]")
+PHONE_COMPACT_PATTERN = re.compile(r"\+(\d{1,4})(\d{3})(\d{3})(\d{4})")
+
+_email_validator = EmailValidator()
+
+
+def normalize_phone(value: str) -> str | None:
+    """
+    Приводит "+7 (701) 123-45-67", "+77011234567" и т.п. к виду "+7 701 123 4567".
+    None, если номер нельзя разобрать
+    """
+    if match := PHONE_COMPACT_PATTERN.fullmatch(PHONE_SEPARATORS.sub("", value)):
+        return "+{} {} {} {}".format(*match.groups())
+    return None
+
+
+def classify_username(value: str) -> str | None:
+    """
+    Код ошибки UsernameField или None, если value — корректный email или телефон.
+    Email проверяется только при наличии "@", телефон — только при "+" в начале
+    """
+    if "@" in value:
+        try:
+            _email_validator(value)
+        except DjangoValidationError:
+            return "invalid"
+        return None
+
+    if not value.startswith("+") or not PHONE_PATTERN.search(value):
+        return "invalid"
+
+    if value.partition(" ")[0] not in COUNTRY_CODES:
+        return "invalid_country_code"
+    return None
+
 
 class PhoneNumberField(serializers.CharField):
     default_error_messages = {
@@ -12,16 +52,25 @@ class PhoneNumberField(serializers.CharField):
         "invalid_country_code": "Данный регион не поддерживается.",
     }
 
-    def __init__(self, **kwargs):
+    def __init__(self, normalize=False, **kwargs):
+        self.normalize = normalize
         kwargs["min_length"] = 15
         kwargs["max_length"] = 18
         kwargs["validators"] = [
             RegexValidator(
-                regex=PHONE_REGEX, message=self.default_error_messages["invalid_format"]
+                regex=PHONE_PATTERN,
+                message=self.default_error_messages["invalid_format"],
             )
         ]
         super().__init__(**kwargs)
 
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if self.normalize:
+            # Неразборчивый номер отсеют валидаторы
+            value = normalize_phone(value) or value
+        return value
+
 
 class UsernameField(serializers.CharField):
     default_error_messages = {
@@ -29,36 +78,64 @@ class UsernameField(serializers.CharField):
         "invalid_country_code": "Данный регион не поддерживается.",
     }
 
-    def __init__(self, **kwargs):
+    def __init__(self, normalize=False, **kwargs):
+        self.normalize = normalize
         kwargs.setdefault("min_length", 5)
         kwargs.setdefault("max_length", 254)
         super().__init__(**kwargs)
-        self.phone_validator = RegexValidator(
-            regex=PHONE_REGEX, message=self.default_error_messages["invalid"]
-        )
-        self.email_validator = EmailValidator(
-            message=self.default_error_messages["invalid"]
-        )
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if self.normalize and "@" not in value:
+            value = normalize_phone(value) or value
+        return value
 
     def run_validation(self, data):
         value = super().run_validation(data)
 
-        # Если это email — сразу возвращаем
-        try:
-            self.email_validator(value)
-            return value
-        except DjangoValidationError:
-            pass
+        if code := classify_username(value):
+            self.fail(code)
 
-        # Проверяем формат телефона
-        try:
-            self.phone_validator(value)
-        except DjangoValidationError:
-            self.fail("invalid")
+        return value
 
-        # Проверяем код страны отдельно
-        country_code = value.split(" ")[0]
-        if country_code not in COUNTRY_CODES:
-            self.fail("invalid_country_code")
 
-        return value
+class UsernameListField(serializers.ListField):
+    """
+    Список username'ов (импорт пользователей): одинаковые значения
+    проверяются один раз, ошибки в том же формате, что у ListField
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("child", UsernameField())
+        super().__init__(**kwargs)
+
+    def run_child_validation(self, data):
+        result = []
+        errors = {}
+        seen = {}
+
+        for idx, item in enumerate(data):
+            key = item if isinstance(item, str) else None
+
+            if key is not None and key in seen:
+                value, error = seen[key]
+            else:
+                value, error = None, None
+                try:
+                    value = self.child.run_validation(item)
+                except ValidationError as e:
+                    error = e.detail
+                except DjangoValidationError as e:
+                    error = get_error_detail(e)
+
+                if key is not None:
+                    seen[key] = (value, error)
+
+            if error is not None:
+                errors[idx] = error
+            else:
+                result.append(value)
+
+        if not errors:
+            return result
+        raise ValidationError(errors)
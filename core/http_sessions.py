@@ -0,0 +1,90 @@
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from core.deadline import deadline_headers, get_timeout
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_TIMEOUT = 3  # sec
+
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter, который подставляет таймаут, если вызывающий код его не передал,
+    урезает его до дедлайна запроса и передаёт дедлайн дальше
+    """
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        kwargs["timeout"] = get_timeout(kwargs["timeout"])
+        request.headers.update(deadline_headers())
+        return super().send(request, **kwargs)
+
+
+def _get_config(service: str) -> dict:
+    """
+    settings.SAFE_REQUEST_SESSIONS — {service: {"pool_connections": ...,
+    "pool_maxsize": ..., "timeout": ..., "headers": {...}}}
+    """
+    return getattr(settings, "SAFE_REQUEST_SESSIONS", {}).get(service, {})
+
+
+def _create_session(service: str) -> requests.Session:
+    config = _get_config(service)
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=config.get("pool_connections", DEFAULT_POOL_CONNECTIONS),
+        pool_maxsize=config.get("pool_maxsize", DEFAULT_POOL_MAXSIZE),
+        timeout=config.get("timeout", DEFAULT_TIMEOUT),
+        # Повторы делает safe_request
+        max_retries=0,
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(config.get("headers", {}))
+    return session
+
+
+def get_session(service: str) -> requests.Session:
+    """
+    Общая на процесс сессия с пулом keep-alive соединений к сервису.
+    Сессию нельзя менять после создания (headers, cookies и т.п.), она общая для потоков
+    """
+    if session := _sessions.get(service):
+        return session
+
+    with _lock:
+        if service not in _sessions:
+            _sessions[service] = _create_session(service)
+        return _sessions[service]
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _reset_after_fork():
+    global _lock
+
+    # Сокеты родителя нельзя использовать в дочернем процессе (gunicorn --preload)
+    _lock = threading.Lock()
+    _sessions.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
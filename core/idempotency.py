@@ -1,74 +1,757 @@
-from typing import Callable
+import asyncio
+import hashlib
+import json
+import logging
+import zlib
+import time
+from datetime import timedelta
+from typing import Callable, NamedTuple
 
-from django.db import transaction
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
 from django.utils.timezone import now
 from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from .exceptions import ConflictException, PermissionDeniedException
+from .metrics import get_counters, hit_rate
 from .models import Idempotency
+from .utils import get_path_policy
 
+logger = logging.getLogger(__name__)
 
-def get_idempotency(path: str, key: str):
-    return Idempotency.objects.filter(path=path, key=key).first()
+DEFAULT_CACHE_TTL = 300  # sec
+DEFAULT_LOCK_WAIT = 5  # sec
+LOCK_POLL_INTERVAL = 0.05  # sec
+DEFAULT_RESERVATION_TIMEOUT = 300  # sec
+BULK_BATCH_SIZE = 1000
+
+cache_counters = get_counters("idempotency_cache")
+
+
+def _get_cache():
+    """
+    settings.IDEMPOTENCY_CACHE — alias кэша Django, None — кэш выключен
+    """
+    alias = getattr(settings, "IDEMPOTENCY_CACHE", None)
+    return caches[alias] if alias else None
+
+
+def _get_cache_ttl(path: str):
+    """
+    settings.IDEMPOTENCY_CACHE_TTL_POLICIES — {префикс path: TTL в сек},
+    TTL 0 или None — path не кэшируется
+    """
+    return get_path_policy(
+        getattr(settings, "IDEMPOTENCY_CACHE_TTL_POLICIES", {}),
+        path,
+        getattr(settings, "IDEMPOTENCY_CACHE_TTL", DEFAULT_CACHE_TTL),
+    )
+
+
+def _digest(path: str, key: str) -> bytes:
+    return hashlib.sha256(f"{path}\0{key}".encode()).digest()
+
+
+def _digest_cache_key(digest: bytes) -> str:
+    return f"idempotency:{bytes(digest).hex()}"
+
+
+def _cache_key(path: str, key: str) -> str:
+    return _digest_cache_key(_digest(path, key))
+
+
+def _cache_delete(digests: list[bytes]):
+    if digests and (cache := _get_cache()):
+        cache.delete_many([_digest_cache_key(digest) for digest in digests])
+
+
+def _is_cacheable(idempotency: Idempotency | None) -> bool:
+    # В кэш попадают только итоговые статусы: резерв в кэше пережил бы своё
+    # удаление и скрыл сообщение от повторной доставки
+    return idempotency is not None and idempotency.status != "processing"
+
+
+def _cache_store(idempotency: Idempotency):
+    if not (cache := _get_cache()) or not (ttl := _get_cache_ttl(idempotency.path)):
+        return
+
+    cache_key = _cache_key(idempotency.path, idempotency.key)
+    # Старое значение удаляется сразу, а новое кладётся только после коммита,
+    # чтобы при откате транзакции в кэше не остался несуществующий статус
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.set(cache_key, idempotency, ttl))
+
+
+def cache_stats() -> dict:
+    stats = cache_counters.snapshot()
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    return {"hits": hits, "misses": misses, "hit_rate": hit_rate(hits, misses)}
+
+
+def _lock_id(digest: bytes) -> int:
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _acquire_locks(digests: list[bytes]):
+    """
+    Ждёт advisory-блокировки на все ключи пачки. Блокировки берутся
+    в порядке возрастания, чтобы пересекающиеся пачки не ловили deadlock
+    """
+    if connection.vendor != "postgresql" or not digests:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(lock_id) "
+            "FROM unnest(%s::bigint[]) AS lock_id ORDER BY lock_id",
+            [sorted({_lock_id(digest) for digest in digests})],
+        )
+
+
+def acquire_lock(path: str, key: str, wait: float | None = None) -> bool:
+    """
+    Берёт транзакционную advisory-блокировку на (path, key), чтобы параллельные
+    запросы с одним ключом не выполнялись одновременно.
+    Вызывается внутри transaction.atomic(), блокировка снимается при коммите/откате.
+    На других СУБД, кроме PostgreSQL, ничего не делает.
+
+    :param wait: сколько секунд ждать блокировку (settings.IDEMPOTENCY_LOCK_WAIT),
+        0 — не ждать
+    :return: False если блокировку не удалось взять за wait секунд
+    """
+    if connection.vendor != "postgresql":
+        return True
+
+    if wait is None:
+        wait = getattr(settings, "IDEMPOTENCY_LOCK_WAIT", DEFAULT_LOCK_WAIT)
+
+    lock_id = _lock_id(_digest(path, key))
+    deadline = time.monotonic() + wait
+
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [lock_id])
+            if cursor.fetchone()[0]:
+                return True
+
+            if time.monotonic() >= deadline:
+                return False
+
+            time.sleep(LOCK_POLL_INTERVAL)
+
+
+def _is_compact() -> bool:
+    """
+    settings.IDEMPOTENCY_COMPACT_STORAGE — вместо тела запроса хранится его
+    sha256-отпечаток, ответ хранится сжатым. path и key остаются целиком:
+    по ним работают политики хранения и кэш. Отпечаток с запросом не
+    сравнивается, он отличает запись, тело которой отброшено компактным
+    режимом, от записи без тела — такую запись нельзя откатить DELETE
+    (см. _check_reversible)
+    """
+    return getattr(settings, "IDEMPOTENCY_COMPACT_STORAGE", False)
+
+
+def _keeps_request(path: str) -> bool:
+    """
+    settings.IDEMPOTENCY_COMPACT_KEEP_REQUEST_PATHS — префиксы path, для которых
+    в компактном режиме request и help_data хранятся целиком (нужны для отката DELETE)
+    """
+    prefixes = getattr(settings, "IDEMPOTENCY_COMPACT_KEEP_REQUEST_PATHS", ())
+    return not _is_compact() or any(path.startswith(p) for p in prefixes)
+
+
+def _dump_json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RenderedResponse(NamedTuple):
+    body: bytes
+    status: int
+    content_type: str
+
+
+def render_response(request, response) -> RenderedResponse:
+    """
+    Рендерит ответ view так же, как это сделает DRF, чтобы повторы отдавали
+    те же байты без повторного рендера
+    """
+    if not isinstance(response, Response):
+        return RenderedResponse(
+            response.content, response.status_code, response.get("Content-Type")
+        )
+
+    renderer = getattr(request, "accepted_renderer", None) or JSONRenderer()
+    media_type = getattr(request, "accepted_media_type", None) or renderer.media_type
+    body = renderer.render(
+        response.data, media_type, {"request": request, "response": response}
+    )
+    if isinstance(body, str):
+        body = body.encode(renderer.charset)
+
+    content_type = (
+        f"{media_type}; charset={renderer.charset}" if renderer.charset else media_type
+    )
+    return RenderedResponse(body, response.status_code, content_type)
+
+
+def _set_payload(
+    idempotency: Idempotency,
+    request,
+    response,
+    help_data,
+    rendered: RenderedResponse | None = None,
+):
+    if _keeps_request(idempotency.path):
+        idempotency.request = request
+        idempotency.help_data = help_data
+        idempotency.request_fingerprint = None
+    else:
+        idempotency.request = None
+        idempotency.help_data = None
+        idempotency.request_fingerprint = (
+            hashlib.sha256(_dump_json(request)).digest()
+            if request is not None
+            else None
+        )
+
+    idempotency.response_status = rendered.status if rendered else None
+    idempotency.response_content_type = rendered.content_type if rendered else None
+
+    if _is_compact() and (rendered or response is not None):
+        idempotency.response = None
+        idempotency.response_body = None
+        idempotency.response_blob = zlib.compress(
+            rendered.body if rendered else _dump_json(response)
+        )
+    else:
+        # Повтору нужны только байты, JSON храним лишь для записей без рендера
+        idempotency.response = None if rendered else response
+        idempotency.response_body = rendered.body if rendered else None
+        idempotency.response_blob = None
+
+
+def _check_reversible(idempotency: Idempotency):
+    # В компактном режиме тело запроса могло не сохраниться
+    if idempotency.request is None and idempotency.request_fingerprint is not None:
+        raise ConflictException(
+            "Idempotency can't be rolled back", "irreversible_idempotency"
+        )
+
+
+def get_response_data(idempotency: Idempotency):
+    if idempotency.response_blob is not None:
+        return json.loads(zlib.decompress(idempotency.response_blob))
+
+    if idempotency.response_body is not None:
+        if "json" not in (idempotency.response_content_type or ""):
+            return None
+        return json.loads(idempotency.response_body)
+
+    return idempotency.response
+
+
+def get_replay_response(idempotency: Idempotency, status: int | None = None):
+    """
+    Повтор ответа: сохранённые байты отдаются как есть, без разбора и рендера.
+    Записи без отрендеренного ответа отдаются через Response как раньше
+
+    :param status: статус вместо сохранённого
+    """
+    if idempotency.response_status is None:
+        return Response(get_response_data(idempotency), status=status or 200)
+
+    body = idempotency.response_body
+    if body is None:
+        body = (
+            zlib.decompress(idempotency.response_blob)
+            if idempotency.response_blob is not None
+            else b""
+        )
+
+    return HttpResponse(
+        body,
+        status=status or idempotency.response_status,
+        content_type=idempotency.response_content_type,
+    )
+
+
+def _filter_idempotency(path: str, key: str):
+    return Idempotency.objects.filter(digest=_digest(path, key)).first()
+
+
+def get_idempotency(path: str, key: str, use_cache: bool = True):
+    if not use_cache or not (cache := _get_cache()) or not _get_cache_ttl(path):
+        return _filter_idempotency(path, key)
+
+    if idempotency := cache.get(_cache_key(path, key)):
+        cache_counters.incr("hits")
+        return idempotency
+
+    cache_counters.incr("misses")
+    # add, а не set: прочитанная до коммита строка не должна перетереть
+    # значение, которое _cache_store положил в on_commit после отката/повтора
+    if _is_cacheable(idempotency := _filter_idempotency(path, key)):
+        cache.add(_cache_key(path, key), idempotency, _get_cache_ttl(path))
+
+    return idempotency
+
+
+async def aget_idempotency(path: str, key: str):
+    queryset = Idempotency.objects.filter(digest=_digest(path, key))
+
+    if not (cache := _get_cache()) or not _get_cache_ttl(path):
+        return await queryset.afirst()
+
+    if idempotency := await cache.aget(_cache_key(path, key)):
+        cache_counters.incr("hits")
+        return idempotency
+
+    cache_counters.incr("misses")
+    if _is_cacheable(idempotency := await queryset.afirst()):
+        await cache.aadd(_cache_key(path, key), idempotency, _get_cache_ttl(path))
+
+    return idempotency
 
 
 def apply(
-    path: str, key: str, request=None, response=None, help_data=None, commit=True
+    path: str,
+    key: str,
+    request=None,
+    response=None,
+    help_data=None,
+    commit=True,
+    rendered: RenderedResponse | None = None,
 ):
     idempotency = Idempotency(
         applied_at=now(),
         path=path,
         key=key,
-        request=request,
-        response=response,
-        help_data=help_data,
+        digest=_digest(path, key),
     )
+    _set_payload(idempotency, request, response, help_data, rendered)
 
     if commit:
         idempotency.save()
+        _cache_store(idempotency)
 
     return idempotency
 
 
-def get_not_applied_idempotency_keys(path, keys):
-    applied_keys = list(
-        Idempotency.objects.filter(path=path, key__in=keys).values_list(
-            "key", flat=True
+def _get_applied_digests(digests: list[bytes]) -> set[bytes]:
+    if not digests:
+        return set()
+
+    if connection.vendor == "postgresql":
+        # Один запрос с массивом вместо IN с тысячами параметров
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT digest FROM {Idempotency._meta.db_table} "
+                "WHERE digest = ANY(%s)",
+                [digests],
+            )
+            return {bytes(row[0]) for row in cursor.fetchall()}
+
+    applied = set()
+    for i in range(0, len(digests), BULK_BATCH_SIZE):
+        applied.update(
+            Idempotency.objects.filter(
+                digest__in=digests[i : i + BULK_BATCH_SIZE]
+            ).values_list("digest", flat=True)
         )
-    )
-    return [key for key in keys if key not in applied_keys]
+    return applied
+
+
+def get_not_applied_idempotency_keys(path, keys):
+    digests = {key: _digest(path, key) for key in keys}
+    applied = _get_applied_digests(list(set(digests.values())))
+    return [key for key in keys if digests[key] not in applied]
+
+
+def apply_many(idempotencies: list[Idempotency], batch_size: int = BULK_BATCH_SIZE):
+    """
+    Сохраняет пачку записей, собранных через apply(..., commit=False), пачками
+    INSERT. Уже применённые ключи и повторы внутри пачки пропускаются
+
+    :return: список реально сохранённых записей
+    """
+    with transaction.atomic():
+        digests = [idempotency.digest for idempotency in idempotencies]
+        _acquire_locks(digests)
+        seen = _get_applied_digests(list(set(digests)))
+
+        creates = []
+        for idempotency in idempotencies:
+            if idempotency.digest not in seen:
+                seen.add(idempotency.digest)
+                creates.append(idempotency)
+
+        Idempotency.objects.bulk_create(creates, batch_size=batch_size)
+
+        for idempotency in creates:
+            _cache_store(idempotency)
+
+    return creates
 
 
 def rollback(idempotency: Idempotency):
     idempotency.rolled_back_at = now()
     idempotency.status = "rolled-back"
-    idempotency.save(update_fields=["rolled_back_at", "status"])
+    idempotency.reserved_at = None
+    idempotency.save(update_fields=["rolled_back_at", "status", "reserved_at"])
+    _cache_store(idempotency)
 
 
-def reapply(idempotency: Idempotency, request, response, help_data):
+def reapply(
+    idempotency: Idempotency,
+    request,
+    response,
+    help_data,
+    rendered: RenderedResponse | None = None,
+):
     idempotency.applied_at = now()
     idempotency.status = "applied"
-    idempotency.request = request
-    idempotency.response = response
-    idempotency.help_data = help_data
+    _set_payload(idempotency, request, response, help_data, rendered)
+    idempotency.reserved_at = None
     idempotency.save(
-        update_fields=["applied_at", "status", "request", "response", "help_data"]
+        update_fields=[
+            "applied_at",
+            "status",
+            "request",
+            "response",
+            "help_data",
+            "request_fingerprint",
+            "response_blob",
+            "response_body",
+            "response_status",
+            "response_content_type",
+            "reserved_at",
+        ]
     )
+    _cache_store(idempotency)
 
 
-def idempotency_required_view(view):
-    def wrapper(request, *args, **kwargs):
-        if not (idempotency_key := request.headers.get("Idempotency-Key", None)):
-            raise PermissionDeniedException(
-                "Set Idempotency-Key Header", "set_idempotency_key_header"
+def _get_reservation_expiry():
+    timeout = getattr(
+        settings, "IDEMPOTENCY_RESERVATION_TIMEOUT", DEFAULT_RESERVATION_TIMEOUT
+    )
+    return now() - timedelta(seconds=timeout)
+
+
+def _is_reserved(idempotency: Idempotency) -> bool:
+    return bool(idempotency.reserved_at) and (
+        idempotency.reserved_at >= _get_reservation_expiry()
+    )
+
+
+def _is_handled(idempotency: Idempotency | None) -> bool:
+    """
+    Сообщение уже обработано или обрабатывается прямо сейчас.
+    Брошенный резерв упавшего воркера не считается: сообщение нужно обработать
+    """
+    return idempotency is not None and (
+        idempotency.status != "processing" or _is_reserved(idempotency)
+    )
+
+
+def release_stale_reservations() -> int:
+    """
+    Снимает резервы, брошенные упавшими воркерами (старше
+    settings.IDEMPOTENCY_RESERVATION_TIMEOUT): незавершённые первые попытки удаляются,
+    у остальных записей резерв просто сбрасывается
+
+    :return: кол-во освобождённых записей
+    """
+    stale = Idempotency.objects.filter(reserved_at__lt=_get_reservation_expiry())
+    processing = stale.filter(status="processing")
+    digests = list(processing.values_list("digest", flat=True))
+    deleted = processing.delete()[0]
+    _cache_delete(digests)
+    return deleted + stale.update(reserved_at=None)
+
+
+def _reserve(path: str, key: str, method: str):
+    """
+    Фаза 1 split-phase режима
+
+    :return: (зарезервированная запись, готовый ответ-повтор)
+    :raise ConflictException: ключ уже выполняется другим запросом
+    """
+    with transaction.atomic():
+        if not acquire_lock(path, key):
+            raise ConflictException(
+                "Idempotency is already in progress", "idempotency_in_progress"
             )
 
-        if request.method not in ["POST", "DELETE"]:
-            raise MethodNotAllowed(method=request.method)
+        idempotency = get_idempotency(path, key, use_cache=False)
+
+        if not idempotency or (
+            idempotency.status == "processing" and not _is_reserved(idempotency)
+        ):
+            if method != "POST":
+                raise ConflictException(
+                    "Idempotency never applied before", "never_applied_idempotency"
+                )
+
+            if not idempotency:
+                idempotency = Idempotency(
+                    path=path,
+                    key=key,
+                    digest=_digest(path, key),
+                    status="processing",
+                    applied_at=now(),
+                )
+
+        elif replay := _get_replay(idempotency, method):
+            return None, replay
+
+        elif _is_reserved(idempotency):
+            raise ConflictException(
+                "Idempotency is already in progress", "idempotency_in_progress"
+            )
+
+        # Брошенный резерв упавшего воркера занимается заново
+        idempotency.reserved_at = now()
+        if idempotency.pk:
+            # Без перезаписи тел запроса и ответа
+            idempotency.save(update_fields=["reserved_at"])
+        else:
+            idempotency.save()
+        return idempotency, None
+
+
+def _release(idempotency: Idempotency):
+    with transaction.atomic():
+        if idempotency.status == "processing":
+            Idempotency.objects.filter(
+                pk=idempotency.pk, reserved_at=idempotency.reserved_at
+            ).delete()
+        else:
+            Idempotency.objects.filter(
+                pk=idempotency.pk, reserved_at=idempotency.reserved_at
+            ).update(reserved_at=None)
+
+    _cache_delete([idempotency.digest])
+
+
+def _is_in_progress(exc: ConflictException) -> bool:
+    return exc.default_code == "idempotency_in_progress"
+
+
+def _reserve_with_wait(path: str, key: str, method: str):
+    deadline = time.monotonic() + getattr(
+        settings, "IDEMPOTENCY_LOCK_WAIT", DEFAULT_LOCK_WAIT
+    )
+
+    while True:
+        try:
+            return _reserve(path, key, method)
+        except ConflictException as e:
+            # Дубликат ждёт завершения первого запроса, чтобы отдать его ответ
+            if not _is_in_progress(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(LOCK_POLL_INTERVAL)
+
+
+async def _areserve_with_wait(path: str, key: str, method: str):
+    deadline = time.monotonic() + getattr(
+        settings, "IDEMPOTENCY_LOCK_WAIT", DEFAULT_LOCK_WAIT
+    )
+
+    while True:
+        try:
+            return await sync_to_async(_reserve)(path, key, method)
+        except ConflictException as e:
+            if not _is_in_progress(e) or time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+
+def _prepare_rollback(request, idempotency: Idempotency):
+    _check_reversible(idempotency)
+    request._full_data = idempotency.request
+    request.help_data = idempotency.help_data
+
+
+def _finish(
+    path: str,
+    key: str,
+    reserved_at,
+    rolling_back: bool,
+    request_data=None,
+    response_data=None,
+    help_data=None,
+    rendered: RenderedResponse | None = None,
+):
+    """
+    Фаза 3 split-phase режима: короткая транзакция с сохранением результата
+
+    :return: сохранённая запись или None, если резерв перехватил другой воркер
+    """
+    with transaction.atomic():
+        acquire_lock(path, key)
+        current = get_idempotency(path, key, use_cache=False)
+
+        if not current or current.reserved_at != reserved_at:
+            logger.warning(
+                "[Idempotency] Резерв %s %s перехвачен другим воркером", path, key
+            )
+            return None
+
+        if rolling_back:
+            rollback(current)
+        else:
+            reapply(current, request_data, response_data, help_data, rendered)
+
+        return current
+
+
+def _get_request_data(request):
+    """
+    Тело запроса: у DRF Request — request.data, у async view (ASGIRequest) —
+    JSON из request.body
+    """
+    if hasattr(request, "data"):
+        return request.data
+    if not request.body:
+        return None
+
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        return request.body.decode(errors="replace")
+
+
+def _collect_result(request, response) -> tuple:
+    """
+    Всё, что сохраняет фаза 3: данные запроса, ответа, help_data и рендер.
+    У не-DRF ответов (JsonResponse и т.п.) хранится только рендер
+    """
+    return (
+        _get_request_data(request),
+        getattr(response, "data", None),
+        getattr(request, "help_data", {}),
+        render_response(request, response),
+    )
+
+
+def _safe_finish(
+    idempotency: Idempotency, path: str, key: str, reserved_at, rolling_back, *result
+):
+    """
+    Фаза 3 с защитой: если сохранить результат не удалось, резерв снимается,
+    а не висит до IDEMPOTENCY_RESERVATION_TIMEOUT
+
+    :return: сохранённая запись или None
+    """
+    try:
+        return _finish(path, key, reserved_at, rolling_back, *result)
+    except Exception:
+        logger.exception(
+            "[Idempotency] Не удалось сохранить результат %s %s, резерв снимается",
+            path,
+            key,
+        )
+
+    try:
+        _release(idempotency)
+    except Exception:
+        logger.exception("[Idempotency] Не удалось снять резерв %s %s", path, key)
+    return None
+
+
+def _split_phase_view(view, request, idempotency_key, *args, **kwargs):
+    idempotency, replay = _reserve_with_wait(
+        request.path, idempotency_key, request.method
+    )
+    if replay:
+        return replay
+
+    reserved_at = idempotency.reserved_at
+    rolling_back = idempotency.status == "applied" and request.method == "DELETE"
+
+    # Фаза 2: view выполняется вне транзакции идемпотентности
+    try:
+        if rolling_back:
+            _prepare_rollback(request, idempotency)
+        response = view(request, *args, **kwargs)
+        result = () if rolling_back else _collect_result(request, response)
+    except Exception:
+        _release(idempotency)
+        raise
+
+    current = _safe_finish(
+        idempotency, request.path, idempotency_key, reserved_at, rolling_back, *result
+    )
+    if rolling_back:
+        return get_replay_response(current or idempotency, status=200)
+
+    return response
+
+
+def _get_replay(idempotency: Idempotency | None, method: str):
+    if not idempotency:
+        return None
+
+    if idempotency.status == "applied" and method == "POST":
+        return get_replay_response(idempotency)
+
+    if idempotency.status == "rolled-back" and method == "DELETE":
+        return get_replay_response(idempotency, status=200)
+
+    return None
+
+
+def _check_view_request(request) -> str:
+    if not (idempotency_key := request.headers.get("Idempotency-Key", None)):
+        raise PermissionDeniedException(
+            "Set Idempotency-Key Header", "set_idempotency_key_header"
+        )
+
+    if request.method not in ["POST", "DELETE"]:
+        raise MethodNotAllowed(method=request.method)
+
+    return idempotency_key
+
+
+def idempotency_required_view(view=None, *, split_phase: bool = False):
+    """
+    split_phase=True — ключ резервируется короткой транзакцией, view выполняется
+    вне транзакции идемпотентности, а ответ сохраняется второй короткой транзакцией.
+    Для view с долгими внешними вызовами; атомарность своих изменений view
+    обеспечивает сам. Брошенные резервы перехватываются после
+    settings.IDEMPOTENCY_RESERVATION_TIMEOUT или чистятся purge_idempotency
+    """
+    if view is None:
+        return lambda view: idempotency_required_view(view, split_phase=split_phase)
+
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = _check_view_request(request)
+
+        # Повторы отдаются без транзакции и блокировки
+        idempotency = get_idempotency(request.path, idempotency_key)
+        if replay := _get_replay(idempotency, request.method):
+            return replay
+
+        if split_phase:
+            return _split_phase_view(view, request, idempotency_key, *args, **kwargs)
 
         with transaction.atomic():
-            idempotency = get_idempotency(request.path, idempotency_key)
+            if not acquire_lock(request.path, idempotency_key):
+                raise ConflictException(
+                    "Idempotency is already in progress", "idempotency_in_progress"
+                )
+
+            # После блокировки читаем актуальное состояние в обход кэша
+            idempotency = get_idempotency(
+                request.path, idempotency_key, use_cache=False
+            )
 
             if not idempotency:
                 if request.method == "POST":
@@ -79,6 +762,7 @@ def idempotency_required_view(view):
                         request.data,
                         response.data,
                         getattr(request, "help_data", {}),
+                        rendered=render_response(request, response),
                     )
                     return response
                 else:
@@ -86,26 +770,34 @@ def idempotency_required_view(view):
                         "Idempotency never applied before", "never_applied_idempotency"
                     )
 
-            if idempotency.status == "applied" and request.method == "POST":
-                return Response(idempotency.response, status=200)
+            if replay := _get_replay(idempotency, request.method):
+                return replay
 
-            elif idempotency.status == "rolled-back" and request.method == "DELETE":
-                return Response(idempotency.response, status=200)
+            elif _is_reserved(idempotency):
+                raise ConflictException(
+                    "Idempotency is already in progress", "idempotency_in_progress"
+                )
 
             elif idempotency.status == "applied" and request.method == "DELETE":
-                request._full_data = idempotency.request
-                request.help_data = idempotency.help_data
+                _prepare_rollback(request, idempotency)
                 view(request, *args, **kwargs)
                 rollback(idempotency)
-                return Response(idempotency.response, status=200)
+                return get_replay_response(idempotency, status=200)
 
-            else:  # rolled-back and POST
+            elif idempotency.status == "processing" and request.method == "DELETE":
+                # Брошенный резерв: первая попытка так и не применилась
+                raise ConflictException(
+                    "Idempotency never applied before", "never_applied_idempotency"
+                )
+
+            else:  # rolled-back and POST, брошенный резерв and POST
                 response = view(request, *args, **kwargs)
                 reapply(
                     idempotency,
                     request.data,
                     response.data,
                     getattr(request, "help_data", {}),
+                    rendered=render_response(request, response),
                 )
                 return response
 
@@ -113,12 +805,169 @@ def idempotency_required_view(view):
 
 
 def idempotency_required_mq_consumer(consumer: Callable):
+    """
+    Ключ захватывается до вызова consumer: advisory-блокировка берётся без ожидания,
+    и если её держит другой consumer, дубликат подтверждается без повторной работы.
+    При ошибке у первого consumer его собственная доставка уйдёт на повтор
+    """
+
     def wrapper(data, idempotency_path, idempotency_key):
-        idempotency = get_idempotency(idempotency_path, idempotency_key)
+        if _is_handled(get_idempotency(idempotency_path, idempotency_key)):
+            return
+
+        with transaction.atomic():
+            if not acquire_lock(idempotency_path, idempotency_key, wait=0):
+                logger.info(
+                    "[Idempotency] Сообщение %s уже обрабатывается, дубликат пропущен",
+                    idempotency_key,
+                )
+                return
+
+            idempotency = get_idempotency(
+                idempotency_path, idempotency_key, use_cache=False
+            )
+            if _is_handled(idempotency):
+                return
+            if idempotency:
+                # Брошенный резерв, блокировка у нас — обрабатываем заново
+                idempotency.delete()
+                _cache_delete([idempotency.digest])
 
-        if not idempotency:
-            with transaction.atomic():
-                consumer(data)
-                apply(idempotency_path, idempotency_key)
+            consumer(data)
+            apply(idempotency_path, idempotency_key)
+
+    return wrapper
+
+
+def idempotency_required_mq_batch_consumer(consumer: Callable):
+    """
+    Пакетный вариант idempotency_required_mq_consumer: wrapper принимает список
+    (data, idempotency_path, idempotency_key), а consumer получает список data
+    ещё не обработанных сообщений. Обработка и фиксация ключей идут одной транзакцией
+    """
+
+    def wrapper(messages: list[tuple]):
+        digests = [_digest(path, key) for _, path, key in messages]
+
+        with transaction.atomic():
+            _acquire_locks(digests)
+            applied = _get_applied_digests(list(set(digests)))
+            if applied:
+                # Брошенные резервы упавших воркеров обрабатываются заново
+                stale = Idempotency.objects.filter(
+                    Q(reserved_at__isnull=True)
+                    | Q(reserved_at__lt=_get_reservation_expiry()),
+                    digest__in=list(applied),
+                    status="processing",
+                )
+                stale_digests = [
+                    bytes(digest) for digest in stale.values_list("digest", flat=True)
+                ]
+                applied.difference_update(stale_digests)
+                stale.delete()
+                _cache_delete(stale_digests)
+
+            datas = []
+            idempotencies = []
+            for (data, path, key), digest in zip(messages, digests):
+                if digest in applied:
+                    continue
+
+                applied.add(digest)
+                datas.append(data)
+                idempotencies.append(apply(path, key, commit=False))
+
+            if datas:
+                consumer(datas)
+                apply_many(idempotencies)
+
+    return wrapper
+
+
+def aidempotency_required_view(view):
+    """
+    Async вариант idempotency_required_view с теми же статусами.
+    Django не поддерживает async-транзакции, поэтому view всегда выполняется
+    в split-phase режиме: резерв и сохранение ответа идут короткими sync-транзакциями,
+    а сам view и повторы (async ORM) работают в event loop
+    """
+
+    async def wrapper(request, *args, **kwargs):
+        idempotency_key = _check_view_request(request)
+
+        idempotency = await aget_idempotency(request.path, idempotency_key)
+        if replay := _get_replay(idempotency, request.method):
+            return replay
+
+        idempotency, replay = await _areserve_with_wait(
+            request.path, idempotency_key, request.method
+        )
+        if replay:
+            return replay
+
+        reserved_at = idempotency.reserved_at
+        rolling_back = idempotency.status == "applied" and request.method == "DELETE"
+
+        try:
+            if rolling_back:
+                _prepare_rollback(request, idempotency)
+            response = await view(request, *args, **kwargs)
+            result = () if rolling_back else _collect_result(request, response)
+        except Exception:
+            await sync_to_async(_release)(idempotency)
+            raise
+
+        current = await sync_to_async(_safe_finish)(
+            idempotency,
+            request.path,
+            idempotency_key,
+            reserved_at,
+            rolling_back,
+            *result,
+        )
+        if rolling_back:
+            return get_replay_response(current or idempotency, status=200)
+        return response
+
+    return wrapper
+
+
+def aidempotency_required_mq_consumer(consumer: Callable):
+    """
+    Async вариант idempotency_required_mq_consumer. Ключ резервируется до вызова
+    consumer и фиксируется после, параллельная доставка того же ключа
+    подтверждается без повторной работы
+    """
+
+    async def wrapper(data, idempotency_path, idempotency_key):
+        # Брошенный резерв не пропускаем, _reserve его перехватит
+        if _is_handled(await aget_idempotency(idempotency_path, idempotency_key)):
+            return
+
+        try:
+            idempotency, replay = await sync_to_async(_reserve)(
+                idempotency_path, idempotency_key, "POST"
+            )
+        except ConflictException as e:
+            if not _is_in_progress(e):
+                raise
+            logger.info(
+                "[Idempotency] Сообщение %s уже обрабатывается, дубликат пропущен",
+                idempotency_key,
+            )
+            return
+
+        if replay:
+            return
+
+        try:
+            await consumer(data)
+        except Exception:
+            await sync_to_async(_release)(idempotency)
+            raise
+
+        await sync_to_async(_finish)(
+            idempotency_path, idempotency_key, idempotency.reserved_at, False
+        )
 
     return wrapper
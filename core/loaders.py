@@ -0,0 +1,216 @@
+"""
+DataLoader-подобная пакетная загрузка поверх safe_request: ключи, запрошенные
+в рамках запроса (или одного тика event loop), уходят одним batch-вызовом,
+а результаты кэшируются до конца запроса.
+
+batch_func принимает список ключей и возвращает dict {key: value}
+или list в том же порядке, что и ключи.
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Callable, Hashable, Iterable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+DEFAULT_MAX_BATCH_SIZE = 100
+
+_loaders = contextvars.ContextVar("batch_loaders", default=None)
+
+
+def _chunks(keys: list, size: int):
+    for i in range(0, len(keys), size):
+        yield keys[i : i + size]
+
+
+def _map_results(keys: list, result, default) -> dict:
+    if result is None:
+        # safe_request с raise_exception=False при ошибке возвращает None
+        return {key: default for key in keys}
+
+    if isinstance(result, dict):
+        return {key: result.get(key, default) for key in keys}
+
+    result = list(result)
+    if len(result) != len(keys):
+        raise ValueError("batch_func должна вернуть столько же значений, сколько ключей")
+    return dict(zip(keys, result))
+
+
+class LazyValue:
+    __slots__ = ("_loader", "_key")
+
+    def __init__(self, loader: "BatchLoader", key: Hashable):
+        self._loader = loader
+        self._key = key
+
+    def get(self):
+        return self._loader.get(self._key)
+
+
+class BatchLoader:
+    """
+    Синхронный загрузчик: load() только копит ключ, первый get() отправляет
+    все накопленные ключи пачками по max_batch_size
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        default=None,
+    ):
+        self.batch_func = batch_func
+        self.max_batch_size = max_batch_size
+        self.default = default
+        self._cache: dict[Hashable, Any] = {}
+        self._pending: dict[Hashable, None] = {}
+
+    def load(self, key: Hashable) -> LazyValue:
+        if key not in self._cache:
+            self._pending[key] = None
+        return LazyValue(self, key)
+
+    def load_many(self, keys: Iterable[Hashable]) -> list:
+        lazy_values = [self.load(key) for key in keys]
+        return [lazy_value.get() for lazy_value in lazy_values]
+
+    def get(self, key: Hashable):
+        if key not in self._cache:
+            self._pending[key] = None
+            self.dispatch()
+        return self._cache.get(key, self.default)
+
+    def dispatch(self):
+        keys, self._pending = list(self._pending), {}
+
+        for chunk in _chunks(keys, self.max_batch_size):
+            self._cache.update(
+                _map_results(chunk, self.batch_func(chunk), self.default)
+            )
+
+    def prime(self, key: Hashable, value):
+        self._cache[key] = value
+
+    def clear(self, key: Hashable | None = None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+class AsyncBatchLoader:
+    """
+    Async загрузчик: все load() за один тик event loop уходят одним batch-вызовом
+    (batch_func — корутина, например с async_safe_request)
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        default=None,
+    ):
+        self.batch_func = batch_func
+        self.max_batch_size = max_batch_size
+        self.default = default
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+        self._scheduled = False
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        if future := self._cache.get(key):
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._cache[key] = loop.create_future()
+        self._queue.append(key)
+
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(lambda: loop.create_task(self._dispatch()))
+
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    async def _dispatch(self):
+        keys, self._queue, self._scheduled = self._queue, [], False
+        chunks = list(_chunks(keys, self.max_batch_size))
+        results = await asyncio.gather(
+            *[self.batch_func(chunk) for chunk in chunks], return_exceptions=True
+        )
+
+        for chunk, result in zip(chunks, results):
+            try:
+                if isinstance(result, BaseException):
+                    raise result
+                values = _map_results(chunk, result, self.default)
+            except BaseException as e:
+                for key in chunk:
+                    # Ошибку не кэшируем, следующий load() попробует снова
+                    self._cache.pop(key).set_exception(e)
+                continue
+
+            for key in chunk:
+                self._cache[key].set_result(values[key])
+
+    def prime(self, key: Hashable, value):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = future
+
+    def clear(self, key: Hashable | None = None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+def get_loader(batch_func: Callable, **kwargs) -> BatchLoader | AsyncBatchLoader:
+    """
+    Загрузчик на текущий запрос (нужен BatchLoaderMiddleware).
+    Вне middleware каждый раз создаётся новый загрузчик без общего кэша
+    """
+    loader_class = (
+        AsyncBatchLoader if asyncio.iscoroutinefunction(batch_func) else BatchLoader
+    )
+
+    if (loaders := _loaders.get()) is None:
+        return loader_class(batch_func, **kwargs)
+
+    if batch_func not in loaders:
+        loaders[batch_func] = loader_class(batch_func, **kwargs)
+    return loaders[batch_func]
+
+
+class BatchLoaderMiddleware:
+    """
+    Свой набор загрузчиков на каждый запрос (WSGI и ASGI)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _loaders.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _loaders.reset(token)
+
+    async def __acall__(self, request):
+        token = _loaders.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _loaders.reset(token)
@@ -0,0 +1,179 @@
+"""
+Ограничение частоты одинаковых ошибок в логах: по каждому ключу в окне
+interval пишутся первые burst записей (traceback только у первой),
+остальные считаются и в конце окна выводится сводка "подавлено N".
+
+settings.LOG_THROTTLE_INTERVAL, LOG_THROTTLE_BURST, LOG_BODY_LIMIT
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+DEFAULT_INTERVAL = 60  # sec
+DEFAULT_BURST = 5
+DEFAULT_BODY_LIMIT = 1000  # символов
+
+_throttles: "weakref.WeakSet[LogThrottle]" = weakref.WeakSet()
+
+
+def truncate(text, limit: int | None = None):
+    if text is None:
+        return None
+
+    text = str(text)
+    if limit is None:
+        limit = getattr(settings, "LOG_BODY_LIMIT", DEFAULT_BODY_LIMIT)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text) - limit} символов обрезано)"
+
+
+class _KeyState:
+    __slots__ = ("window_start", "count", "suppressed", "level")
+
+    def __init__(self, now: float, level: int):
+        self.window_start = now
+        self.count = 0
+        self.suppressed = 0
+        self.level = level
+
+
+class LogThrottle:
+    """
+    Сводки "подавлено N" выводятся по таймеру в конце окна (фоновый
+    daemon-поток, только пока есть подавленные записи), а остаток —
+    при завершении процесса через flush()
+    """
+
+    def __init__(self, logger: logging.Logger, prefix: str):
+        self.logger = logger
+        self.prefix = prefix
+        self._states: dict[object, _KeyState] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._timer: threading.Timer | None = None
+        _throttles.add(self)
+
+    @property
+    def interval(self) -> float:
+        return getattr(settings, "LOG_THROTTLE_INTERVAL", DEFAULT_INTERVAL)
+
+    @property
+    def burst(self) -> int:
+        return getattr(settings, "LOG_THROTTLE_BURST", DEFAULT_BURST)
+
+    def _sweep(self, now: float, interval: float, force: bool = False) -> list[tuple]:
+        # Вызывать под self._lock: сводки по ключам, окно которых закончилось
+        summaries = []
+        for key, state in list(self._states.items()):
+            if not force and now - state.window_start < interval:
+                continue
+            if state.suppressed:
+                summaries.append((state.level, key, state.suppressed))
+            del self._states[key]
+        self._last_sweep = now
+        return summaries
+
+    def _emit(self, summaries: list[tuple], interval: float):
+        for level, key, suppressed in summaries:
+            self.logger.log(
+                level,
+                "[%s] %s: подавлено %d повторов ошибки за %s сек",
+                self.prefix,
+                key,
+                suppressed,
+                interval,
+            )
+
+    def _schedule(self, delay: float):
+        # Вызывать под self._lock
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(max(delay, 0), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        now = time.monotonic()
+        interval = self.interval
+
+        with self._lock:
+            self._timer = None
+            summaries = self._sweep(now, interval)
+            pending = [
+                state.window_start
+                for state in self._states.values()
+                if state.suppressed
+            ]
+            if pending:
+                self._schedule(min(pending) + interval - now)
+
+        self._emit(summaries, interval)
+
+    def flush(self):
+        """
+        Выводит все накопленные сводки сразу (при остановке процесса)
+        """
+        interval = self.interval
+        with self._lock:
+            summaries = self._sweep(time.monotonic(), interval, force=True)
+        self._emit(summaries, interval)
+
+    def check(self, level: int, key) -> tuple[bool, bool]:
+        """
+        Можно ли писать запись по key и нужен ли ей traceback (первая в окне).
+        Заодно выводит сводки по закончившимся окнам
+        """
+        now = time.monotonic()
+        interval = self.interval
+
+        with self._lock:
+            summaries = (
+                self._sweep(now, interval) if now - self._last_sweep >= interval else []
+            )
+            state = self._states.get(key)
+            if state is None or now - state.window_start >= interval:
+                if state and state.suppressed:
+                    summaries.append((state.level, key, state.suppressed))
+                state = self._states[key] = _KeyState(now, level)
+
+            state.count += 1
+            allowed = state.count <= self.burst
+            if not allowed:
+                state.suppressed += 1
+                # Сводка выйдет в конце окна, даже если ошибок больше не будет
+                self._schedule(state.window_start + interval - now)
+
+        self._emit(summaries, interval)
+        return allowed, state.count == 1
+
+    def log(self, level: int, key, msg: str, *args, exc_info=None, extra=None):
+        allowed, first = self.check(level, key)
+        if allowed:
+            self.logger.log(
+                level, msg, *args, exc_info=exc_info if first else None, extra=extra
+            )
+        return allowed
+
+
+def flush_all():
+    for throttle in list(_throttles):
+        throttle.flush()
+
+
+def _reset_after_fork():
+    # Таймеры родителя в дочернем процессе не существуют
+    for throttle in list(_throttles):
+        throttle._lock = threading.Lock()
+        throttle._timer = None
+        throttle._states.clear()
+
+
+atexit.register(flush_all)
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seller_activation import (
+    SellerActivationMQ,
+    handle_activation_changed,
+    is_shared_cache_enabled,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Слушает события seller-activation-changed и сбрасывает кэш активации "
+        "продавцов (нужны settings.SELLER_ACTIVATION_QUEUE "
+        "и SELLER_ACTIVATION_CACHE)"
+    )
+
+    def handle(self, *args, **options):
+        if not SellerActivationMQ.queue:
+            raise CommandError("settings.SELLER_ACTIVATION_QUEUE не задан")
+
+        # Инвалидации в памяти этого процесса веб-воркеры не увидят
+        if not is_shared_cache_enabled():
+            raise CommandError("settings.SELLER_ACTIVATION_CACHE не задан")
+
+        SellerActivationMQ.consume(handle_activation_changed)
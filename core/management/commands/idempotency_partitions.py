@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.partitioning import (
+    LEGACY_TABLE,
+    convert_to_partitioned,
+    ensure_partitions,
+    is_partitioned,
+)
+from core.retention import get_max_retention_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Партиционирование таблицы идемпотентности по applied_at (только PostgreSQL). "
+        "Без --convert создаёт недостающие партиции наперёд"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Перенести таблицу в партиционированную разметку",
+        )
+        parser.add_argument("--months-ahead", type=int, default=3)
+
+    def handle(self, *args, convert, months_ahead, **options):
+        try:
+            if convert:
+                if is_partitioned():
+                    raise CommandError("Таблица уже партиционирована")
+
+                # Записи старше срока хранения всё равно будут удалены
+                copied = convert_to_partitioned(
+                    months_ahead=months_ahead, copy_days=get_max_retention_days()
+                )
+                self.stdout.write(
+                    f"Перенесено {copied} записей. "
+                    f"Старая таблица {LEGACY_TABLE} удаляется вручную после проверки"
+                )
+                return
+
+            if not is_partitioned():
+                raise CommandError("Таблица не партиционирована, используйте --convert")
+
+            for name in ensure_partitions(months_ahead=months_ahead):
+                self.stdout.write(f"Партиция {name} готова")
+        except RuntimeError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.utils.timezone import now
+
+from core.idempotency import release_stale_reservations
+from core.partitioning import drop_expired_partitions, ensure_partitions, is_partitioned
+from core.retention import DEFAULT_PURGE_BATCH_SIZE, get_max_retention_days, purge_expired
+
+
+class Command(BaseCommand):
+    help = "Удаляет просроченные записи идемпотентности согласно политикам хранения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            "--sleep", type=float, default=0, help="Пауза между пачками в секундах"
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, batch_size, sleep, dry_run, **options):
+        at = now()
+
+        if is_partitioned():
+            if not dry_run:
+                try:
+                    ensure_partitions()
+                except DatabaseError as e:
+                    # Без новых партиций записи идут в DEFAULT, чистку не прерываем
+                    self.stderr.write(f"Не удалось создать партиции: {e}")
+
+            if (max_days := get_max_retention_days()) is not None:
+                dropped = drop_expired_partitions(
+                    at - timedelta(days=max_days), dry_run=dry_run
+                )
+                for name in dropped:
+                    self.stdout.write(f"Партиция {name} удалена")
+
+        if not dry_run:
+            released = release_stale_reservations()
+            self.stdout.write(f"Освобождено {released} брошенных резервов")
+
+        result = purge_expired(batch_size=batch_size, sleep=sleep, dry_run=dry_run, at=at)
+
+        for prefix, deleted in result.items():
+            policy = prefix if prefix is not None else "<по умолчанию>"
+            self.stdout.write(f"{policy}: {deleted} записей удалено")
+
+        if dry_run:
+            self.stdout.write("Dry run: ничего не удалено")
@@ -0,0 +1,50 @@
+import threading
+from collections import defaultdict
+
+_registry: dict[str, "Counters"] = {}
+_registry_lock = threading.Lock()
+
+
+class Counters:
+    """
+    Потокобезопасные счётчики в памяти процесса (для дашбордов и отладки)
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._values[name] += value
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._values.get(name, 0)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+def get_counters(namespace: str) -> Counters:
+    with _registry_lock:
+        if namespace not in _registry:
+            _registry[namespace] = Counters(namespace)
+        return _registry[namespace]
+
+
+def snapshot() -> dict[str, dict[str, int]]:
+    with _registry_lock:
+        counters = list(_registry.values())
+    return {c.namespace: c.snapshot() for c in counters}
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return hits / total if total else 0.0
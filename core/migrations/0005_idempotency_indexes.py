@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_idempotency_applied_at_idempotency_rolled_back_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idempotency',
+            index=models.Index(fields=['applied_at'], name='core_idempotency_applied_at'),
+        ),
+    ]
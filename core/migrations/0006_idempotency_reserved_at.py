@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_idempotency_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotency',
+            name='reserved_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='idempotency',
+            name='status',
+            field=models.CharField(choices=[('applied', 'Applied'), ('rolled-back', 'Rolled Back'), ('processing', 'Processing')], default='applied', max_length=30),
+        ),
+    ]
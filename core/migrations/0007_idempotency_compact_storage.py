@@ -0,0 +1,106 @@
+# Generated by Django 5.1.15 on 2026-10-19 12:34
+
+import hashlib
+
+import core.models
+from core.partitioning import is_partitioned
+from django.db import NotSupportedError, migrations, models, transaction
+
+BATCH_SIZE = 2000
+
+
+def fill_digest(apps, schema_editor):
+    Idempotency = apps.get_model("core", "Idempotency")
+    using = schema_editor.connection.alias
+
+    # Миграция не атомарная: каждая пачка коммитится отдельно и не держит
+    # блокировки на всю таблицу до конца заполнения
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                Idempotency.objects.using(using)
+                .filter(digest__isnull=True)
+                .only("id", "path", "key")
+                .order_by("id")[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+
+            for idempotency in batch:
+                idempotency.digest = hashlib.sha256(
+                    f"{idempotency.path}\0{idempotency.key}".encode()
+                ).digest()
+            Idempotency.objects.using(using).bulk_update(batch, ["digest"])
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    CREATE INDEX CONCURRENTLY на PostgreSQL, обычный AddIndex на остальных базах.
+    django.contrib.postgres.operations не подходит: он требует psycopg при импорте
+    """
+
+    def _is_concurrent(self, schema_editor, model):
+        # На партиционированной таблице PostgreSQL не умеет строить индекс CONCURRENTLY
+        if schema_editor.connection.vendor != "postgresql" or (
+            model._meta.db_table == core.models.Idempotency._meta.db_table
+            and is_partitioned(schema_editor.connection.alias)
+        ):
+            return False
+
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                "CONCURRENTLY нельзя выполнять в транзакции, нужен atomic = False"
+            )
+        return True
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        if self._is_concurrent(schema_editor, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        if self._is_concurrent(schema_editor, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_idempotency_reserved_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotency',
+            name='digest',
+            field=core.models.BytesField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='idempotency',
+            name='request_fingerprint',
+            field=core.models.BytesField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='idempotency',
+            name='response_blob',
+            field=core.models.BytesField(null=True),
+        ),
+        migrations.RunPython(fill_digest, migrations.RunPython.noop, atomic=False),
+        AddIndexConcurrently(
+            model_name='idempotency',
+            index=models.Index(fields=['digest'], name='core_idempotency_digest'),
+        ),
+    ]
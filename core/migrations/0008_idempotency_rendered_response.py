@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-19 12:36
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_idempotency_compact_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotency',
+            name='response_body',
+            field=core.models.BytesField(null=True),
+        ),
+        migrations.AddField(
+            model_name='idempotency',
+            name='response_content_type',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='idempotency',
+            name='response_status',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
@@ -3,19 +3,49 @@ from django.db import models
 
 IDEMPOTENCY_STATUSES = (
     ("applied", "Applied"),
-    ("rolled-back", "Rolled Back")
+    ("rolled-back", "Rolled Back"),
+    ("processing", "Processing"),
 )
 
 
+class BytesField(models.BinaryField):
+    """
+    BinaryField, который всегда возвращает bytes (psycopg отдаёт memoryview,
+    а его нельзя положить в кэш)
+    """
+
+    def from_db_value(self, value, expression, connection):
+        return bytes(value) if value is not None else None
+
+
 class Idempotency(models.Model):
     status = models.CharField(max_length=30, choices=IDEMPOTENCY_STATUSES, default="applied")
 
     applied_at = models.DateTimeField(null=True)
     rolled_back_at = models.DateTimeField(null=True)
+    # Не пусто, пока запрос с этим ключом выполняется (split-phase режим)
+    reserved_at = models.DateTimeField(null=True)
 
     path = models.CharField(max_length=500)
     key = models.CharField(max_length=500)
+    # sha256(path + "\0" + key), по нему идёт поиск записи
+    digest = BytesField(max_length=32, null=True)
 
     request = models.JSONField(null=True)
     response = models.JSONField(null=True)
     help_data = models.JSONField(null=True)
+
+    # Компактное хранение: отпечаток запроса вместо тела и сжатый ответ
+    request_fingerprint = BytesField(max_length=32, null=True)
+    response_blob = BytesField(null=True)
+
+    # Отрендеренный ответ для повторов без повторного рендера
+    response_body = BytesField(null=True)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_content_type = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["digest"], name="core_idempotency_digest"),
+            models.Index(fields=["applied_at"], name="core_idempotency_applied_at"),
+        ]
@@ -1,17 +1,153 @@
-def calculate_delivery_cost(weight_g: int) -> int:
+"""
+Тарифы доставки: таблицы по весовым диапазонам, региону и перевозчику.
+
+settings.DELIVERY_TARIFFS — {carrier: {region: {"bands": [[до_грамм, цена], ...],
+"extra_rate": цена за каждый шаг сверху, "extra_step_g": шаг в граммах}}}.
+Регион "default" используется, если для региона нет своей таблицы.
+Пакетный расчёт использует NumPy, если он установлен (extra "numpy").
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Iterable
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CARRIER = "open_post"
+DEFAULT_REGION = "default"
+DEFAULT_TARIFFS = {
+    DEFAULT_CARRIER: {
+        DEFAULT_REGION: {
+            "bands": [[1000, 900]],  # до 1 кг
+            "extra_rate": 60,  # за каждый кг сверху
+            "extra_step_g": 1000,
+        },
+    },
+}
+
+_tariffs: dict[tuple[str, str], "Tariff"] | None = None
+_lock = threading.Lock()
+
+
+class Tariff:
+    """
+    Скомпилированная таблица: цена первого диапазона, в который попал вес,
+    выше последнего — его цена плюс extra_rate за каждый начатый extra_step_g
+    """
+
+    __slots__ = (
+        "limits",
+        "prices",
+        "extra_rate",
+        "extra_step_g",
+        "_np_limits",
+        "_np_prices",
+    )
+
+    def __init__(self, bands: Iterable, extra_rate: int, extra_step_g: int = 1000):
+        bands = sorted((int(limit), int(price)) for limit, price in bands)
+        if not bands:
+            raise ValueError("Тариф должен содержать хотя бы один диапазон")
+
+        self.limits = tuple(limit for limit, _ in bands)
+        self.prices = tuple(price for _, price in bands)
+        self.extra_rate = int(extra_rate)
+        self.extra_step_g = int(extra_step_g)
+        self._np_limits = np.array(self.limits, dtype=np.int64) if np else None
+        self._np_prices = np.array(self.prices, dtype=np.int64) if np else None
+
+    def cost(self, weight_g: int) -> int:
+        i = bisect_left(self.limits, weight_g)
+        if i < len(self.limits):
+            return self.prices[i]
+
+        extra_weight_g = weight_g - self.limits[-1]
+        # округляем вверх до целого шага, эквивалент math.ceil
+        extra_steps = -(-extra_weight_g // self.extra_step_g)
+        return self.prices[-1] + extra_steps * self.extra_rate
+
+    def cost_many(self, weights_g):
+        """
+        Стоимость для массива весов: np.ndarray[int64], без NumPy — list[int]
+        """
+        if np is None:
+            return [self.cost(weight_g) for weight_g in weights_g]
+
+        weights_g = np.asarray(weights_g, dtype=np.int64)
+        i = np.searchsorted(self._np_limits, weights_g, side="left")
+        in_bands = i < len(self.limits)
+
+        extra_steps = -(-(weights_g - self.limits[-1]) // self.extra_step_g)
+        return np.where(
+            in_bands,
+            self._np_prices[np.minimum(i, len(self.limits) - 1)],
+            self.prices[-1] + extra_steps * self.extra_rate,
+        )
+
+
+def _compile_tariffs() -> dict[tuple[str, str], Tariff]:
+    config = {carrier: dict(regions) for carrier, regions in DEFAULT_TARIFFS.items()}
+    for carrier, regions in getattr(settings, "DELIVERY_TARIFFS", {}).items():
+        config.setdefault(carrier, {}).update(regions)
+
+    return {
+        (carrier, region): Tariff(**table)
+        for carrier, regions in config.items()
+        for region, table in regions.items()
+    }
+
+
+def get_tariff(carrier: str = DEFAULT_CARRIER, region: str | None = None) -> Tariff:
+    global _tariffs
+
+    if _tariffs is None:
+        with _lock:
+            if _tariffs is None:
+                _tariffs = _compile_tariffs()
+
+    tariff = _tariffs.get((carrier, region or DEFAULT_REGION)) or _tariffs.get(
+        (carrier, DEFAULT_REGION)
+    )
+    if tariff is None:
+        raise ValueError(f"Нет тарифа для перевозчика {carrier}")
+    return tariff
+
+
+def reset_tariffs():
+    """
+    Перекомпилировать таблицы при следующем обращении (после смены настроек)
+    """
+    global _tariffs
+
+    with _lock:
+        _tariffs = None
+
+
+def calculate_delivery_cost(
+    weight_g: int, region: str | None = None, carrier: str = DEFAULT_CARRIER
+) -> int:
     """
     Рассчитывает стоимость доставки по весу в граммах.
 
     :param weight_g: вес товара в граммах
+    :param region: регион доставки, по умолчанию общий тариф
+    :param carrier: перевозчик
     :return: стоимость доставки в тенге
     """
-    base_price = 900  # до 1 кг
-    extra_rate = 60  # за каждый кг сверху
+    return get_tariff(carrier, region).cost(weight_g)
 
-    if weight_g <= 1000:
-        return base_price
-    else:
-        extra_weight_g = weight_g - 1000
-        # переводим граммы в кг и округляем вверх до целого кг
-        extra_kilos = -(-extra_weight_g // 1000)  # эквивалент math.ceil
-        return base_price + extra_kilos * extra_rate
+
+def calculate_delivery_costs(
+    weights_g: Iterable[int], region: str | None = None, carrier: str = DEFAULT_CARRIER
+):
+    """
+    Стоимость доставки для всех позиций корзины за один вызов.
+
+    :return: np.ndarray[int64] с NumPy, иначе list[int]
+    """
+    return get_tariff(carrier, region).cost_many(weights_g)
@@ -0,0 +1,235 @@
+"""
+Опциональная разметка таблицы идемпотентности на месячные партиции по applied_at.
+Работает только на PostgreSQL. Просроченные данные удаляются целыми партициями
+(DETACH + DROP), а не построчно.
+
+Так как у партиционированной таблицы уникальные ограничения и PK обязаны включать
+applied_at, id остаётся обычным индексированным столбцом с собственной sequence.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections, transaction
+from django.utils.timezone import now
+
+from .models import Idempotency
+
+logger = logging.getLogger(__name__)
+
+TABLE = Idempotency._meta.db_table
+PARTITION_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_pdefault"
+LEGACY_TABLE = f"{TABLE}_legacy"
+SEQUENCE = f"{TABLE}_pid_seq"
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(value: datetime) -> datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def _check_vendor(using):
+    if connections[using].vendor != "postgresql":
+        raise RuntimeError("Партиционирование поддерживается только на PostgreSQL")
+
+
+def is_partitioned(using: str = "default") -> bool:
+    if connections[using].vendor != "postgresql":
+        return False
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def _create_partition(cursor, month: datetime, table: str = TABLE) -> str:
+    name = _partition_name(month)
+    # Границы генерируются нами, поэтому подставляются литералами:
+    # DDL не поддерживает серверные параметры
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+        f"TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+    )
+    return name
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def _create_partition_from_default(cursor, month: datetime) -> str:
+    """
+    Создаёт партицию, даже если её записи уже попали в DEFAULT партицию
+    (например, cron долго не запускался): иначе CREATE ... PARTITION OF падает
+    на проверке ограничения DEFAULT партиции. Вызывать в транзакции
+    """
+    name = _partition_name(month)
+    if _table_exists(cursor, name) or not _table_exists(cursor, DEFAULT_PARTITION):
+        return _create_partition(cursor, month)
+
+    moved = f"{TABLE}_moved"
+    cursor.execute(f"CREATE TEMP TABLE {moved} (LIKE {TABLE}) ON COMMIT DROP")
+    cursor.execute(
+        f"WITH moved_rows AS (DELETE FROM {DEFAULT_PARTITION} "
+        "WHERE applied_at >= %s AND applied_at < %s RETURNING *) "
+        f"INSERT INTO {moved} SELECT * FROM moved_rows",
+        [month, _next_month(month)],
+    )
+    count = cursor.rowcount
+
+    _create_partition(cursor, month)
+    if count:
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {moved}")
+        logger.warning(
+            "[Partitioning] %s записей перенесено из %s в %s",
+            count,
+            DEFAULT_PARTITION,
+            name,
+        )
+    cursor.execute(f"DROP TABLE {moved}")
+    return name
+
+
+def ensure_partitions(months_ahead: int = 3, using: str = "default") -> list[str]:
+    """
+    Создаёт партиции с текущего месяца на months_ahead месяцев вперёд.
+    Записи этих месяцев, уже попавшие в DEFAULT партицию, переносятся в новые
+    """
+    _check_vendor(using)
+    month = _month_start(now())
+    names = []
+
+    for _ in range(months_ahead + 1):
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            names.append(_create_partition_from_default(cursor, month))
+        month = _next_month(month)
+
+    return names
+
+
+def convert_to_partitioned(
+    months_ahead: int = 3, copy_days: int | None = None, using: str = "default"
+) -> int:
+    """
+    Переносит данные в партиционированную таблицу. Старая таблица остаётся
+    под именем {TABLE}_legacy, её нужно удалить вручную после проверки.
+
+    :param copy_days: переносить только записи за последние copy_days дней
+    :return: кол-во перенесённых записей
+    """
+    _check_vendor(using)
+    if is_partitioned(using):
+        return 0
+
+    new_table = f"{TABLE}_new"
+    indexes = [index.name for index in Idempotency._meta.indexes]
+    cutoff = now() - timedelta(days=copy_days) if copy_days is not None else None
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+
+        cursor.execute(
+            f"SELECT MIN(applied_at), COALESCE(MAX(id), 0) FROM {TABLE}"
+            + (" WHERE applied_at >= %s" if cutoff else ""),
+            [cutoff] if cutoff else [],
+        )
+        first_applied_at, max_id = cursor.fetchone()
+
+        cursor.execute(
+            f"CREATE TABLE {new_table} (LIKE {TABLE} INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (applied_at)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {new_table}.id")
+        cursor.execute(
+            f"ALTER TABLE {new_table} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')"
+        )
+        cursor.execute("SELECT setval(%s, %s, false)", [SEQUENCE, max_id + 1])
+
+        # Имена индексов должны остаться прежними, чтобы миграции Django их находили
+        for name in indexes:
+            cursor.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy")
+        cursor.execute(f"CREATE INDEX {TABLE}_id ON {new_table} (id)")
+        for index in Idempotency._meta.indexes:
+            columns = ", ".join(index.fields)
+            cursor.execute(f"CREATE INDEX {index.name} ON {new_table} ({columns})")
+
+        month = _month_start(first_applied_at or now())
+        last_month = _month_start(now())
+        for _ in range(months_ahead):
+            last_month = _next_month(last_month)
+        while month <= last_month:
+            _create_partition(cursor, month, new_table)
+            month = _next_month(month)
+        # Сюда попадают записи без applied_at и вне созданных диапазонов
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {new_table} DEFAULT")
+
+        cursor.execute(
+            f"INSERT INTO {new_table} SELECT * FROM {TABLE}"
+            + (" WHERE applied_at >= %s" if cutoff else ""),
+            [cutoff] if cutoff else [],
+        )
+        copied = cursor.rowcount
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {TABLE}")
+
+    return copied
+
+
+def get_partitions(using: str = "default") -> list[str]:
+    _check_vendor(using)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid) "
+            "ORDER BY c.relname",
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def drop_expired_partitions(
+    before: datetime, dry_run: bool = False, using: str = "default"
+) -> list[str]:
+    """
+    Отсоединяет и удаляет месячные партиции, целиком лежащие раньше before
+    """
+    dropped = []
+
+    for name in get_partitions(using):
+        suffix = name.removeprefix(PARTITION_PREFIX)
+        if name == DEFAULT_PARTITION or not suffix.isdigit():
+            continue
+
+        month = datetime.strptime(suffix, "%Y%m").replace(tzinfo=timezone.utc)
+        if _next_month(month) > before:
+            continue
+
+        if not dry_run:
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+                cursor.execute(f"DROP TABLE {name}")
+
+        dropped.append(name)
+
+    return dropped
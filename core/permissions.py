@@ -1,9 +1,10 @@
-import requests
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from rest_framework import permissions
 
+from core.http_sessions import get_session
 from core.safe_request import safe_request
+from core.seller_activation import get_activation
 
 
 @safe_request()
@@ -11,7 +12,7 @@ def _check_seller_confirmation(seller_account_id: int) -> bool:
     url = f"{settings.USER_SERVICE_URL}v1/sellers/{seller_account_id}/is-activated/"
     headers = {"X-API-KEY": settings.USER_SERVICE_API_KEY}
 
-    response = requests.get(url, headers=headers, timeout=3)
+    response = get_session("user_service").get(url, headers=headers, timeout=3)
     response.raise_for_status()
     return response.json()["is_activated"]
 
@@ -48,7 +49,7 @@ class IsConfirmedSeller(permissions.BasePermission):
         if request.user["role"] != "seller":
             return False
 
-        return _check_seller_confirmation(request.user["user_id"])
+        return get_activation(request.user["user_id"], _check_seller_confirmation)
 
 
 class IsSuperAdmin(permissions.BasePermission):
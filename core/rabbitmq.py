@@ -9,6 +9,8 @@ from django.db import connection
 from pika.channel import Channel
 from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker
 
+from core.log_throttle import LogThrottle, truncate
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -18,6 +20,9 @@ formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Во время аварии одна и та же ошибка повторяется на каждой попытке
+_log_throttle = LogThrottle(logger, "RabbitMQ")
+
 
 class BaseRabbitMQ:
     host = None
@@ -85,7 +90,13 @@ class BaseRabbitMQ:
 
             cls._declare_topology() if not cls._topology_declared else None
         except Exception as exc:
-            logger.critical("[RabbitMQ] Не удалось соединиться: %s", exc, exc_info=True)
+            _log_throttle.log(
+                logging.CRITICAL,
+                ("connect", type(exc).__name__),
+                "[RabbitMQ] Не удалось соединиться: %s",
+                exc,
+                exc_info=True,
+            )
             cls._connection = None
             cls._channel = None
 
@@ -208,7 +219,15 @@ class BaseRabbitMQ:
 
     @classmethod
     def _safe_raise_exception(cls, msg, exc, saga_func, saga_args, raise_exception):
-        logger.critical("[RabbitMQ] %s: %s", msg, exc, exc_info=True)
+        _log_throttle.log(
+            logging.CRITICAL,
+            (msg, type(exc).__name__),
+            "[RabbitMQ] %s: %s",
+            msg,
+            truncate(exc),
+            exc_info=True,
+            extra={"rabbitmq_error": msg, "exception_name": type(exc).__name__},
+        )
 
         if saga_func and saga_args:
             try:
@@ -362,10 +381,13 @@ class BaseRabbitMQ:
                 )
 
             except Exception as e:
-                logger.critical(
+                _log_throttle.log(
+                    logging.CRITICAL,
+                    (queue, type(e).__name__),
                     "[RabbitMQ] Неизвестная ошибка при обработка сообщений: %s",
-                    e,
+                    truncate(e),
                     exc_info=True,
+                    extra={"queue": queue, "exception_name": type(e).__name__},
                 )
 
                 if retry_exchange:
@@ -415,7 +437,9 @@ class BaseRabbitMQ:
                 break
 
             except (AMQPConnectionError, ChannelClosedByBroker, RuntimeError) as exc:
-                logger.critical(
+                _log_throttle.log(
+                    logging.CRITICAL,
+                    ("connect", type(exc).__name__),
                     "[RabbitMQ] Не удалось соединиться: %s. Retrying...",
                     exc,
                     exc_info=True,
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple
+
+from core.metrics import get_counters
+
+DEFAULT_MAXSIZE = 1024
+REFRESH_WORKERS = 4
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=REFRESH_WORKERS, thread_name_prefix="request-cache"
+            )
+        return _executor
+
+
+def _reset_after_fork():
+    global _executor, _executor_lock
+
+    # Потоки родителя в дочернем процессе не существуют
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def make_call_key(args: tuple, kwargs: dict):
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # Например, dict или list в аргументах
+        key = repr(key)
+    return key
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов safe_request с TTL
+
+    :param ttl: сколько секунд ответ считается свежим
+    :param stale_ttl: сколько секунд после ttl отдаётся устаревший ответ,
+        пока он обновляется в фоне (stale-while-revalidate)
+    :param stale_if_error_ttl: сколько секунд после ttl отдаётся устаревший ответ,
+        если downstream недоступен (открыт circuit breaker, таймауты, 5xx)
+    :param maxsize: максимум записей, старые вытесняются
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        stale_if_error_ttl: float = 0,
+        maxsize: int = DEFAULT_MAXSIZE,
+        name: str | None = None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_if_error_ttl = stale_if_error_ttl
+        self.maxsize = maxsize
+        self.name = name
+        self.counters = None
+        # Выставляется safe_request: какие ошибки позволяют отдать устаревший ответ
+        self.is_stale_error: Callable[[Exception], bool] = lambda exc: False
+
+        self._data: OrderedDict[Any, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def bind(self, name: str):
+        self.name = self.name or name
+        self.counters = get_counters(f"request_cache.{self.name}")
+
+    def _incr(self, name: str):
+        if self.counters:
+            self.counters.incr(name)
+
+    def _get(self, key) -> _Entry | None:
+        with self._lock:
+            if entry := self._data.get(key):
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = _Entry(value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._incr("evictions")
+
+    def invalidate(self, *args, **kwargs):
+        with self._lock:
+            self._data.pop(make_call_key(args, kwargs), None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _refresh(self, key, fn: Callable):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, fn())
+                self._incr("refreshes")
+            except Exception:
+                self._incr("refresh_errors")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _get_executor().submit(refresh)
+
+    def get_or_call(self, key, fn: Callable):
+        entry = self._get(key)
+        now = time.monotonic()
+
+        if entry and now < entry.expires_at:
+            self._incr("hits")
+            return entry.value
+
+        if entry and now < entry.expires_at + self.stale_ttl:
+            self._incr("stale")
+            self._refresh(key, fn)
+            return entry.value
+
+        self._incr("misses")
+        try:
+            value = fn()
+        except Exception as e:
+            if (
+                entry
+                and now < entry.expires_at + self.stale_if_error_ttl
+                and self.is_stale_error(e)
+            ):
+                self._incr("stale_if_error")
+                return entry.value
+            raise
+
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        stats = self.counters.snapshot() if self.counters else {}
+        with self._lock:
+            stats["size"] = len(self._data)
+        return stats
@@ -0,0 +1,114 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import Idempotency
+from .utils import get_path_policy
+
+# Сколько дней хранятся записи идемпотентности, если для path нет своей политики.
+# None — хранить бессрочно
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_PURGE_BATCH_SIZE = 1000
+
+
+def get_retention_policies() -> dict:
+    """
+    settings.IDEMPOTENCY_RETENTION_POLICIES — {префикс path/очереди: дни или None}
+    """
+    return getattr(settings, "IDEMPOTENCY_RETENTION_POLICIES", {})
+
+
+def get_default_retention_days():
+    return getattr(settings, "IDEMPOTENCY_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+
+
+def get_retention_days(path: str):
+    return get_path_policy(
+        get_retention_policies(), path, get_default_retention_days()
+    )
+
+
+def get_max_retention_days():
+    """
+    Максимальный срок хранения среди всех политик, None если хоть одна бессрочная
+    """
+    days = [get_default_retention_days(), *get_retention_policies().values()]
+
+    if any(value is None for value in days):
+        return None
+
+    return max(days)
+
+
+def _expired_querysets(at):
+    policies = get_retention_policies()
+    prefixes = sorted(policies, key=len, reverse=True)
+
+    for prefix in [*prefixes, None]:
+        days = policies[prefix] if prefix is not None else get_default_retention_days()
+        if days is None:
+            continue
+
+        if prefix is None:
+            queryset = Idempotency.objects.all()
+            # Записи с собственной политикой чистятся отдельно
+            excluded = prefixes
+        else:
+            queryset = Idempotency.objects.filter(path__startswith=prefix)
+            # Более длинные префиксы перекрывают текущий
+            excluded = [
+                other
+                for other in prefixes
+                if len(other) > len(prefix) and other.startswith(prefix)
+            ]
+
+        for other in excluded:
+            queryset = queryset.exclude(path__startswith=other)
+
+        # applied_at пустой только у записей, созданных до его появления
+        yield prefix, queryset.filter(
+            Q(applied_at__lt=at - timedelta(days=days)) | Q(applied_at__isnull=True)
+        )
+
+
+def purge_expired(
+    batch_size: int = DEFAULT_PURGE_BATCH_SIZE,
+    sleep: float = 0,
+    dry_run: bool = False,
+    at=None,
+) -> dict:
+    """
+    Удаляет просроченные записи идемпотентности пачками по batch_size.
+    Каждая пачка удаляется отдельным коротким запросом, без общей транзакции,
+    чтобы не держать долгие блокировки.
+
+    :return: {префикс политики (None — политика по умолчанию): кол-во удалённых}
+    """
+    at = at or now()
+    result = {}
+
+    for prefix, queryset in _expired_querysets(at):
+        if dry_run:
+            result[prefix] = queryset.count()
+            continue
+
+        deleted = 0
+        while True:
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+
+            deleted += Idempotency.objects.filter(id__in=ids).delete()[0]
+
+            if len(ids) < batch_size:
+                break
+
+            if sleep:
+                time.sleep(sleep)
+
+        result[prefix] = deleted
+
+    return result
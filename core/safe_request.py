@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 import pybreaker
@@ -6,17 +7,67 @@ from pybreaker import CircuitBreakerError
 from requests.exceptions import ConnectionError, HTTPError, Timeout
 from tenacity import RetryError
 
+from core.bulkhead import Bulkhead, BulkheadFullError, get_bulkhead
+from core.circuit_breakers import get_circuit_breaker
+from core.deadline import check_deadline, stop_before_deadline
+from core.log_throttle import LogThrottle, truncate
+from core.request_cache import make_call_key
+from core.singleflight import SingleFlight
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 logger = logging.getLogger(__name__)
+_log_throttle = LogThrottle(logger, "Safe Request Error")
+
+# Сетевые ошибки async-клиентов (httpx/aiohttp), если они установлены
+ASYNC_TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    *((httpx.TimeoutException, httpx.NetworkError) if httpx else ()),
+    *((aiohttp.ClientConnectionError,) if aiohttp else ()),
+)
+
+# Ошибки HTTP-статуса (raise_for_status) разных клиентов
+HTTP_STATUS_ERRORS = (
+    HTTPError,
+    *((httpx.HTTPStatusError,) if httpx else ()),
+    *((aiohttp.ClientResponseError,) if aiohttp else ()),
+)
+
+
+def _is_not_breaker_failure(exc) -> bool:
+    # 5xx приходит как HTTPError из raise_for_status и тоже считается сбоем
+    return not isinstance(
+        _map_exception(exc),
+        (Timeout, ConnectionError, MS5xxError, *ASYNC_TRANSIENT_ERRORS),
+    )
+
 
+# Общий breaker, только если его явно передали в safe_request(circuit_breaker=...)
 base_circuit_breaker = pybreaker.CircuitBreaker(
     fail_max=5 * 3,
     reset_timeout=90,
-    exclude=[lambda e: not isinstance(e, (Timeout, ConnectionError, MS5xxError))],
+    exclude=[_is_not_breaker_failure],
 )
 
 base_retry = tenacity.retry(
     retry=tenacity.retry_if_exception_type((Timeout, ConnectionError)),
-    stop=tenacity.stop_after_attempt(3),
+    stop=tenacity.stop_after_attempt(3) | stop_before_deadline,
+    wait=tenacity.wait_exponential(multiplier=0.5, min=0.5, max=5),
+    reraise=True,
+)
+
+# tenacity сам ждёт через asyncio.sleep, если оборачивает корутину
+base_async_retry = tenacity.retry(
+    retry=tenacity.retry_if_exception_type(ASYNC_TRANSIENT_ERRORS),
+    stop=tenacity.stop_after_attempt(3) | stop_before_deadline,
     wait=tenacity.wait_exponential(multiplier=0.5, min=0.5, max=5),
     reraise=True,
 )
@@ -29,33 +80,58 @@ class MS5xxError(Exception):
         super().__init__(self.message)
 
 
-def _safe_raise_exception(exc, request_name, saga_func, saga_args, raise_exception):
-    if isinstance(exc, HTTPError):
-        if 500 <= exc.response.status_code < 600:
-            exc = MS5xxError(exc.response)
+def _map_exception(exc):
+    if isinstance(exc, HTTP_STATUS_ERRORS):
+        response = getattr(exc, "response", None)
+        # aiohttp хранит статус в самом исключении
+        status_code = getattr(exc, "status", None) or getattr(
+            response, "status_code", None
+        )
+        if status_code and 500 <= status_code < 600:
+            return MS5xxError(response)
 
+    return exc
+
+
+def _log_exception(exc, request_name):
     response = getattr(exc, "response", None)
     status_code = getattr(response, "status_code", None)
-    text = getattr(response, "text", None)
+
+    allowed, with_traceback = _log_throttle.check(
+        logging.ERROR, (request_name, type(exc).__name__, status_code)
+    )
+    if not allowed:
+        return
+
     url = getattr(response, "url", None)
     method = getattr(getattr(response, "request", None), "method", None)
+    text = truncate(getattr(response, "text", None))
 
     logger.error(
-        msg=(
-            "\n\n\n"
-            f"[Safe Request Error]"
-            f"\nRequest Name: {request_name}"
-            f"\nRequest Method: {method}"
-            f"\nRequest URL: {url}"
-            f"\nException Name: {type(exc).__name__}"
-            f"\nException: {exc}"
-            f"\nResponse Code: {status_code}"
-            f"\nResponse Text: {text}"
-            "\n\n\n"
-        ),
-        exc_info=True,
+        "[Safe Request Error] %s: %s %s -> %s %s: %s | %s",
+        request_name,
+        method,
+        url,
+        status_code,
+        type(exc).__name__,
+        exc,
+        text,
+        exc_info=with_traceback,
+        extra={
+            "request_name": request_name,
+            "request_method": method,
+            "request_url": str(url) if url else None,
+            "response_code": status_code,
+            "exception_name": type(exc).__name__,
+            "response_text": text,
+        },
     )
 
+
+def _safe_raise_exception(exc, request_name, saga_func, saga_args, raise_exception):
+    exc = _map_exception(exc)
+    _log_exception(exc, request_name)
+
     if saga_func and saga_args:
         try:
             saga_func(*saga_args, exc=exc)
@@ -69,7 +145,36 @@ def _safe_raise_exception(exc, request_name, saga_func, saga_args, raise_excepti
         raise exc
 
 
-def safe_request(retry=base_retry, circuit_breaker=base_circuit_breaker):
+def _resolve_circuit_breaker(request, circuit_breaker, breaker_name):
+    if circuit_breaker:
+        return circuit_breaker
+
+    return get_circuit_breaker(
+        breaker_name or f"{request.__module__}.{request.__qualname__}",
+        exclude=[_is_not_breaker_failure],
+    )
+
+
+def _resolve_bulkhead(bulkhead) -> Bulkhead | None:
+    if isinstance(bulkhead, str):
+        return get_bulkhead(bulkhead)
+    return bulkhead
+
+
+def _is_stale_error(exc) -> bool:
+    return isinstance(
+        exc, (CircuitBreakerError, BulkheadFullError)
+    ) or not _is_not_breaker_failure(exc)
+
+
+def safe_request(
+    retry=base_retry,
+    circuit_breaker=None,
+    breaker_name=None,
+    cache=None,
+    singleflight=False,
+    bulkhead=None,
+):
     """
     Note:
     1. in your function, you must use response.raise_for_status()
@@ -78,18 +183,61 @@ def safe_request(retry=base_retry, circuit_breaker=base_circuit_breaker):
     4. if you want you can don't use saga func and just add try/except block in your code where you call your func
     5. never touch this safe_request.py file, if it needed to be changed, notify me
     6. errors which can be raised are written here (below)
+    7. use core.http_sessions.get_session(service) instead of requests.get/post,
+       so retries and normal calls reuse warm keep-alive connections
+    8. each decorated function has its own circuit breaker, pass the same breaker_name
+       (e.g. downstream host) to share one breaker between functions
+    9. under core.deadline.DeadlineMiddleware attempts and retries stop at the request
+       deadline (DeadlineExceeded), sessions shrink timeouts and forward the deadline;
+       without sessions use core.deadline.get_timeout() and deadline_headers()
+    10. cache=core.request_cache.ResponseCache(...) caches read-only lookups by arguments,
+        wrapper.cache.invalidate(*args, **kwargs) drops one entry
+    11. singleflight=True makes concurrent calls with the same arguments share
+        one in-flight request and its result or exception
+    12. bulkhead="user_service" (name from settings.SAFE_REQUEST_BULKHEADS or
+        core.bulkhead.Bulkhead) limits concurrent attempts to one downstream,
+        when it's saturated BulkheadFullError is raised without waiting for the service
     """
 
     def decorator(request):
-        def wrapper(
-            *args, saga_func=None, saga_args=None, raise_exception=True, **kwargs
-        ):
-            @circuit_breaker(name=request.__name__)
+        def call(*args, **kwargs):
+            breaker = _resolve_circuit_breaker(request, circuit_breaker, breaker_name)
+
+            @breaker
             def inner():
+                check_deadline()
                 return request(*args, **kwargs)
 
+            def attempt():
+                if not (slots := _resolve_bulkhead(bulkhead)):
+                    return inner()
+                with slots.acquired():
+                    return inner()
+
+            return retry(attempt)()
+
+        name = f"{request.__module__}.{request.__qualname__}"
+        flight = SingleFlight(name) if singleflight else None
+
+        if cache:
+            cache.bind(name)
+            cache.is_stale_error = _is_stale_error
+
+        def shared_call(*args, **kwargs):
+            if not flight:
+                return call(*args, **kwargs)
+            return flight.do(make_call_key(args, kwargs), lambda: call(*args, **kwargs))
+
+        def wrapper(
+            *args, saga_func=None, saga_args=None, raise_exception=True, **kwargs
+        ):
             try:
-                return retry(inner)()
+                if cache:
+                    return cache.get_or_call(
+                        make_call_key(args, kwargs),
+                        lambda: shared_call(*args, **kwargs),
+                    )
+                return shared_call(*args, **kwargs)
             except RetryError as e:
                 _safe_raise_exception(
                     e.last_attempt.exception(),
@@ -109,6 +257,77 @@ def safe_request(retry=base_retry, circuit_breaker=base_circuit_breaker):
                     e, request.__name__, saga_func, saga_args, raise_exception
                 )
 
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+async def _asafe_raise_exception(
+    exc, request_name, saga_func, saga_args, raise_exception
+):
+    exc = _map_exception(exc)
+    _log_exception(exc, request_name)
+
+    if saga_func and saga_args:
+        try:
+            if asyncio.iscoroutinefunction(saga_func):
+                await saga_func(*saga_args, exc=exc)
+            else:
+                saga_func(*saga_args, exc=exc)
+        except Exception as e:
+            logger.critical(
+                f"[SAGA] Ошибка при выполнений {saga_func.__name__}: {e}", exc_info=True
+            )
+            raise e
+
+    if raise_exception:
+        raise exc
+
+
+def async_safe_request(
+    retry=base_async_retry, circuit_breaker=None, breaker_name=None, bulkhead=None
+):
+    """
+    Async вариант safe_request для корутин на httpx/aiohttp с тем же контрактом
+    (saga_func, saga_args, raise_exception, MS5xxError, bulkhead).
+    Ожидание между повторами не блокирует поток, saga_func может быть корутиной
+    """
+
+    def decorator(request):
+        async def wrapper(
+            *args, saga_func=None, saga_args=None, raise_exception=True, **kwargs
+        ):
+            async def inner():
+                # pybreaker не умеет в корутины без tornado, поэтому состояние
+                # обновляется через контекстный менеджер вокруг await
+                breaker = _resolve_circuit_breaker(
+                    request, circuit_breaker, breaker_name
+                )
+                check_deadline()
+                if not (slots := _resolve_bulkhead(bulkhead)):
+                    with breaker.calling():
+                        return await request(*args, **kwargs)
+
+                async with slots.aacquired():
+                    with breaker.calling():
+                        return await request(*args, **kwargs)
+
+            try:
+                return await retry(inner)()
+            except RetryError as e:
+                await _asafe_raise_exception(
+                    e.last_attempt.exception(),
+                    request.__name__,
+                    saga_func,
+                    saga_args,
+                    raise_exception,
+                )
+            except Exception as e:
+                await _asafe_raise_exception(
+                    e, request.__name__, saga_func, saga_args, raise_exception
+                )
+
         return wrapper
 
     return decorator
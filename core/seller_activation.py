@@ -0,0 +1,140 @@
+"""
+Кэш статуса активации продавцов для IsConfirmedSeller.
+
+L1 — память процесса (короткий TTL), L2 — общий Django cache (длинный TTL).
+SellerActivationMQ слушает события seller-activation-changed и сразу обновляет L2,
+TTL остаётся страховкой на случай потерянных событий.
+
+L1 события не видит совсем: consumer работает в своём процессе, поэтому
+после деактивации процессы веб-воркеров отдают старый статус до истечения
+SELLER_ACTIVATION_LOCAL_TTL.
+
+L2 включается только явным SELLER_ACTIVATION_CACHE с общим для всех процессов
+бэкендом (Redis, Memcached, БД), LocMemCache не принимается: инвалидации
+consumer'а остались бы в его памяти. Без L2 используется только L1.
+
+settings:
+- SELLER_ACTIVATION_CACHE — алиас общего Django cache для L2
+- SELLER_ACTIVATION_CACHE_TTL, SELLER_ACTIVATION_LOCAL_TTL — TTL в секундах
+- SELLER_ACTIVATION_QUEUE — своя очередь сервиса на fanout exchange
+"""
+
+import logging
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from core.rabbitmq import BaseRabbitMQ
+from core.request_cache import ResponseCache, make_call_key
+
+DEFAULT_CACHE_TTL = 300  # sec
+DEFAULT_LOCAL_TTL = 10  # sec
+CACHE_KEY_PREFIX = "seller_activation"
+
+logger = logging.getLogger(__name__)
+
+# L1 в каждом процессе, события его не видят, поэтому TTL короткий
+local_cache = ResponseCache(
+    ttl=getattr(settings, "SELLER_ACTIVATION_LOCAL_TTL", DEFAULT_LOCAL_TTL)
+)
+local_cache.bind("seller_activation")
+
+
+def _get_cache():
+    """
+    Общий кэш L2 или None, если он не настроен
+    """
+    if not (alias := getattr(settings, "SELLER_ACTIVATION_CACHE", None)):
+        return None
+
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache):
+        raise ImproperlyConfigured(
+            f"SELLER_ACTIVATION_CACHE={alias!r} — LocMemCache не общий для процессов"
+        )
+    return cache
+
+
+def is_shared_cache_enabled() -> bool:
+    return _get_cache() is not None
+
+
+def _cache_key(seller_account_id: int) -> str:
+    return f"{CACHE_KEY_PREFIX}:{seller_account_id}"
+
+
+def get_activation(seller_account_id: int, fetch: Callable[[int], bool]) -> bool:
+    """
+    Статус активации из L1/L2, при промахе — fetch(seller_account_id)
+    """
+
+    def shared_lookup() -> bool:
+        if (cache := _get_cache()) is None:
+            return bool(fetch(seller_account_id))
+
+        key = _cache_key(seller_account_id)
+
+        if (is_activated := cache.get(key)) is None:
+            is_activated = bool(fetch(seller_account_id))
+            cache.set(
+                key,
+                is_activated,
+                getattr(settings, "SELLER_ACTIVATION_CACHE_TTL", DEFAULT_CACHE_TTL),
+            )
+        return is_activated
+
+    return local_cache.get_or_call(
+        make_call_key((seller_account_id,), {}), shared_lookup
+    )
+
+
+def invalidate(seller_account_id: int, is_activated: bool | None = None):
+    """
+    Если статус известен из события, он сразу записывается в L2, иначе запись удаляется
+    """
+    local_cache.invalidate(seller_account_id)
+    if (cache := _get_cache()) is None:
+        return
+
+    key = _cache_key(seller_account_id)
+
+    if is_activated is None:
+        cache.delete(key)
+    else:
+        cache.set(
+            key,
+            bool(is_activated),
+            getattr(settings, "SELLER_ACTIVATION_CACHE_TTL", DEFAULT_CACHE_TTL),
+        )
+
+
+def handle_activation_changed(
+    data: dict, idempotency_key: str | None = None, idempotency_path: str | None = None
+):
+    # Инвалидация идемпотентна, повторное событие ничего не ломает
+    seller_account_id = data.get("seller_account_id")
+    if seller_account_id is None:
+        logger.warning("[Seller Activation] Событие без seller_account_id: %s", data)
+        return
+
+    invalidate(seller_account_id, data.get("is_activated"))
+
+
+class SellerActivationMQ(BaseRabbitMQ):
+    host = getattr(settings, "RABBIT_MQ_HOST", "localhost")
+    port = getattr(settings, "RABBIT_MQ_PORT", "5672")
+    username = getattr(settings, "RABBIT_MQ_USER", "guest")
+    password = getattr(settings, "RABBIT_MQ_PASSWORD", "guest")
+    virtual_host = getattr(settings, "SELLER_ACTIVATION_VIRTUAL_HOST", "users")
+
+    exchange = "seller.activation.changed"
+    exchange_type = "fanout"
+    publishing_routing_key = ""
+
+    # fanout: у каждого сервиса своя очередь, иначе события получит только один
+    queue = getattr(settings, "SELLER_ACTIVATION_QUEUE", None)
+    consuming_routing_key = "seller.activation.changed"
+    requeue_on_fail = False
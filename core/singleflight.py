@@ -0,0 +1,51 @@
+import threading
+from typing import Any, Callable
+
+from core.metrics import get_counters
+
+
+class _Call:
+    __slots__ = ("event", "result", "exception")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом: первый поток выполняет
+    вызов, остальные ждут и получают тот же результат или исключение
+    """
+
+    def __init__(self, name: str):
+        self.counters = get_counters(f"singleflight.{name}")
+        self._calls: dict[Any, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self.counters.incr("shared")
+            call.event.wait()
+            if call.exception:
+                raise call.exception
+            return call.result
+
+        self.counters.incr("calls")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
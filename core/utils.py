@@ -1,6 +1,70 @@
+from collections import defaultdict, deque
+from typing import Any, Callable, NamedTuple
+
 from django.conf import settings
+from django.db import NotSupportedError, connections, transaction
+from django.db.models import QuerySet
 from rest_framework.exceptions import ValidationError
 
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ObjectsChanges(NamedTuple):
+    created_ids: list
+    updated_ids: list
+    deleted_ids: list
+    # В режиме upsert созданные и обновлённые не различаются
+    upserted_ids: list = []
+
+    @property
+    def created(self) -> int:
+        return len(self.created_ids)
+
+    @property
+    def updated(self) -> int:
+        return len(self.updated_ids)
+
+    @property
+    def deleted(self) -> int:
+        return len(self.deleted_ids)
+
+
+def _key_getter(fields: str | tuple[str, ...]) -> Callable:
+    if isinstance(fields, str):
+        # Пустые значения (None, "", 0) не сопоставляются, как и раньше
+        return lambda obj: getattr(obj, fields) or None
+
+    def get_key(obj):
+        key = tuple(getattr(obj, field) for field in fields)
+        return None if any(value is None for value in key) else key
+
+    return get_key
+
+
+def _build_index(objects: list, get_key: Callable) -> dict[Any, deque]:
+    index = defaultdict(deque)
+    for obj in objects:
+        if (key := get_key(obj)) is not None:
+            index[key].append(obj)
+    return index
+
+
+def _pop_match(index: dict[Any, deque], key, matched: set):
+    if key is None or not (bucket := index.get(key)):
+        return None
+
+    while bucket:
+        candidate = bucket.popleft()
+        # Уже сопоставлен по другому полю
+        if id(candidate) not in matched:
+            return candidate
+    return None
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
 
 def save_objects_changes(
     model,
@@ -10,51 +74,139 @@ def save_objects_changes(
     comparison_field2=None,
     update_fields=None,
     deleting_status=None,
-):
-    creates = []
-    updates = []
+    batch_size=DEFAULT_BATCH_SIZE,
+    upsert=False,
+) -> ObjectsChanges:
+    """
+    Синхронизирует currents с news: совпавшие по comparison_field1
+    (иначе по comparison_field2) обновляются, новые создаются,
+    оставшиеся удаляются или получают deleting_status. Всё в одной транзакции.
 
-    deletes = list(currents)
-    news = list(news)
+    comparison_field может быть кортежем полей (составной ключ),
+    такой ключ не сопоставляется, если одно из значений None.
 
-    for new in news:
-        found = None
+    upsert=True: currents — QuerySet (не загружается), comparison_field1 — поля
+    уникального ограничения, вместо сравнения в Python один
+    INSERT ... ON CONFLICT DO UPDATE и удаление отсутствующих одним запросом
+    """
+    if upsert:
+        return _upsert_objects_changes(
+            model,
+            currents,
+            news,
+            comparison_field1,
+            comparison_field2,
+            update_fields,
+            deleting_status,
+            batch_size,
+        )
 
-        for delete in deletes:
-            delete_field = getattr(delete, comparison_field1)
-            new_field = getattr(new, comparison_field1)
+    currents = list(currents)
+    news = list(news)
 
-            if delete_field and new_field and (delete_field == new_field):
-                found = delete
-                break
+    get_key1 = _key_getter(comparison_field1)
+    get_key2 = _key_getter(comparison_field2) if comparison_field2 else None
+    index1 = _build_index(currents, get_key1)
+    index2 = _build_index(currents, get_key2) if get_key2 else {}
 
-        if not found and comparison_field2:
-            for delete in deletes:
-                delete_field = getattr(delete, comparison_field2)
-                new_field = getattr(new, comparison_field2)
+    creates = []
+    updates = []
+    matched = set()
 
-                if delete_field and new_field and (delete_field == new_field):
-                    found = delete
-                    break
+    for new in news:
+        found = _pop_match(index1, get_key1(new), matched)
+        if not found and get_key2:
+            found = _pop_match(index2, get_key2(new), matched)
 
         if found:
+            matched.add(id(found))
             new.id = found.id
-            deletes.remove(found)
             updates.append(new)
         else:
             creates.append(new)
 
-    if deleting_status:
-        model.objects.filter(id__in=[delete.id for delete in deletes]).update(
-            **deleting_status
+    delete_ids = [current.id for current in currents if id(current) not in matched]
+
+    with transaction.atomic():
+        for ids in _chunks(delete_ids, batch_size):
+            if deleting_status:
+                model.objects.filter(id__in=ids).update(**deleting_status)
+            else:
+                model.objects.filter(id__in=ids).delete()
+
+        if update_fields:
+            model.objects.bulk_update(updates, update_fields, batch_size=batch_size)
+
+        created = model.objects.bulk_create(creates, batch_size=batch_size)
+
+    return ObjectsChanges(
+        created_ids=[obj.pk for obj in created],
+        updated_ids=[obj.id for obj in updates] if update_fields else [],
+        deleted_ids=delete_ids,
+    )
+
+
+def _upsert_objects_changes(
+    model,
+    currents,
+    news,
+    unique_fields,
+    comparison_field2,
+    update_fields,
+    deleting_status,
+    batch_size,
+) -> ObjectsChanges:
+    if comparison_field2:
+        raise ValueError("В режиме upsert сравнение только по comparison_field1")
+    if not isinstance(currents, QuerySet):
+        raise ValueError("В режиме upsert currents должен быть QuerySet")
+    if not update_fields:
+        raise ValueError("В режиме upsert update_fields обязателен")
+    if not connections[currents.db].features.can_return_rows_from_bulk_insert:
+        raise NotSupportedError(
+            "В режиме upsert СУБД должна возвращать pk из bulk_create"
+        )
+
+    unique_fields = (
+        [unique_fields] if isinstance(unique_fields, str) else list(unique_fields)
+    )
+
+    with transaction.atomic():
+        # PostgreSQL возвращает pk и для вставленных, и для обновлённых строк
+        upserted = model.objects.bulk_create(
+            list(news),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
         )
-    else:
-        model.objects.filter(id__in=[delete.id for delete in deletes]).delete()
+        upserted_ids = [obj.pk for obj in upserted]
+
+        # Без RETURNING (MySQL, старый SQLite) pk не вернутся, и exclude ниже
+        # удалил бы весь currents
+        if any(pk is None for pk in upserted_ids):
+            raise NotSupportedError(
+                "В режиме upsert СУБД должна возвращать pk из bulk_create"
+            )
+
+        stale = currents.exclude(pk__in=upserted_ids)
+        if deleting_status:
+            stale = stale.exclude(**deleting_status)
 
-    if update_fields:
-        model.objects.bulk_update(updates, update_fields)
+        # Отсутствующих в новом наборе обычно мало
+        delete_ids = list(stale.values_list("pk", flat=True))
+        for ids in _chunks(delete_ids, batch_size):
+            if deleting_status:
+                model.objects.filter(pk__in=ids).update(**deleting_status)
+            else:
+                model.objects.filter(pk__in=ids).delete()
 
-    model.objects.bulk_create(creates)
+    return ObjectsChanges(
+        created_ids=[],
+        updated_ids=[],
+        deleted_ids=delete_ids,
+        upserted_ids=upserted_ids,
+    )
 
 
 def validate_cdn_link(url: str):
@@ -62,3 +214,20 @@ def validate_cdn_link(url: str):
         raise ValidationError("Нужна ссылка на CDN.")
 
     return url
+
+
+def get_path_policy(policies: dict, path: str, default=None):
+    """
+    Возвращает значение политики для path по самому длинному совпадающему префиксу.
+
+    :param policies: словарь {префикс path: значение}
+    :param path: path запроса или имя очереди
+    :param default: значение, если ни один префикс не подошёл
+    """
+    matched = None
+
+    for prefix in policies:
+        if path.startswith(prefix) and (matched is None or len(prefix) > len(matched)):
+            matched = prefix
+
+    return policies[matched] if matched is not None else default